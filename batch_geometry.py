@@ -0,0 +1,152 @@
+"""
+Векторные варианты функций geometry для массивов отрезков (NumPy).
+
+intersect_many и make_vectors обрабатывают N отрезков за вызов без ветвлений в Python: пересечение ищется
+через векторные произведения, частные случаи (вертикальные отрезки, отрезки на одной прямой) выбираются
+масками. Результаты совпадают с geometry.intersect_xy и geometry.make_vector_xy, которые остаются эталоном.
+Отрезки нулевой длины не поддерживаются.
+
+    python batch_geometry.py     # проверка совпадения со скалярными функциями и замер скорости
+"""
+import random
+import time
+
+import numpy as np
+
+from geometry import intersect_xy, make_vector_xy
+
+
+def _cross(a, b):
+    """
+    Векторные произведения пар векторов (..., 2)
+    """
+    return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+
+def intersect_many(segments_1, segments_2):
+    """
+    Точки пересечения пар отрезков, как intersect_xy для каждой пары.
+    Для отрезков на одной прямой, как и в intersect_xy, точка - (наибольший из минимумов x,
+    наибольший из минимумов y) при перекрытии или касании отрезков
+    :param segments_1: массив (N, 2, 2) - первые отрезки (начало, конец)
+    :param segments_2: массив (N, 2, 2) - вторые отрезки
+    :return: (точки (N, 2), маска (N,) - есть ли пересечение); для пар без пересечения точки - nan
+    """
+    segments_1 = np.asarray(segments_1, dtype=np.float64)
+    segments_2 = np.asarray(segments_2, dtype=np.float64)
+    p1, p2 = segments_1[:, 0], segments_1[:, 1]
+    p3, p4 = segments_2[:, 0], segments_2[:, 1]
+    d1 = p2 - p1
+    d2 = p4 - p3
+    offset = p3 - p1
+
+    denominator = _cross(d1, d2)
+    crossing = denominator != 0
+    safe = np.where(crossing, denominator, 1.0)[:, None]
+    # одно деление на точку: для целочисленных отрезков числитель вычисляется точно
+    points = (p1 * safe + d1 * _cross(offset, d2)[:, None]) / safe
+
+    low_1, high_1 = np.minimum(p1, p2), np.maximum(p1, p2)
+    low_2, high_2 = np.minimum(p3, p4), np.maximum(p3, p4)
+    inside = np.all((low_1 <= points) & (points <= high_1) & (low_2 <= points) & (points <= high_2), axis=1)
+
+    # отрезки на одной прямой: общая часть проверяется по x, а для вертикальной прямой - по y
+    collinear = ~crossing & (_cross(offset, d1) == 0)
+    low = np.maximum(low_1, low_2)
+    high = np.minimum(high_1, high_2)
+    vertical = d1[:, 0] == 0
+    overlap = np.where(vertical, low[:, 1] <= high[:, 1], low[:, 0] <= high[:, 0])
+
+    mask = (crossing & inside) | (collinear & overlap)
+    points = np.where(crossing[:, None], points, low)
+    points[~mask] = np.nan
+    return points, mask
+
+
+def make_vectors(starts, aims, length):
+    """
+    Концы отрезков из точек starts через точки aims длины length, как make_vector_xy для каждой пары
+    :param starts: массив (N, 2) - начала отрезков
+    :param aims: массив (N, 2) - точки, через которые проходят отрезки
+    :param length: длина отрезков (число или массив (N,))
+    :return: массив (N, 2) - концы отрезков
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    aims = np.asarray(aims, dtype=np.float64)
+    delta = aims - starts
+    norm = np.hypot(delta[:, 0], delta[:, 1])
+    # совпадающие точки, как в make_vector_xy, дают отрезок вниз (вдоль оси y)
+    unit = np.where((norm > 0)[:, None], delta / np.where(norm > 0, norm, 1.0)[:, None], (0.0, 1.0))
+    return starts + unit * np.asarray(length, dtype=np.float64).reshape(-1, 1)
+
+
+def random_segments(rng, count, size, integer):
+    """
+    Случайные отрезки ненулевой длины для self_check: на целочисленной сетке часто встречаются
+    вертикальные, параллельные и лежащие на одной прямой отрезки
+    :return: массив (count, 2, 2)
+    """
+    segments = []
+    while len(segments) < count:
+        if integer:
+            segment = [[rng.randint(0, size), rng.randint(0, size)] for _ in range(2)]
+        else:
+            segment = [[rng.uniform(0, size), rng.uniform(0, size)] for _ in range(2)]
+        if segment[0] != segment[1]:
+            segments.append(segment)
+    return np.array(segments, dtype=np.float64)
+
+
+def self_check(count=20000, seed=0, tolerance=1e-9):
+    """
+    Проверка совпадения intersect_many и make_vectors со скалярными функциями geometry
+    на случайных отрезках (с вещественными и целочисленными координатами).
+    Скалярная функция считает через наклоны прямых и может ошибаться на единицу младшего разряда,
+    поэтому расхождение в наличии пересечения допускается, только если точка лежит на краю отрезка
+    :return: число сравненных пар
+    :raises AssertionError: при расхождении
+    """
+    rng = random.Random(seed)
+    checked = 0
+    for integer, size in (False, 100.0), (True, 6):
+        first = random_segments(rng, count, size, integer)
+        second = random_segments(rng, count, size, integer)
+        points, mask = intersect_many(first, second)
+        for i in range(count):
+            expected = intersect_xy(*first[i].ravel(), *second[i].ravel())
+            if (expected is not None) == mask[i]:
+                if expected is not None:
+                    assert np.allclose(points[i], expected, rtol=0, atol=tolerance), (first[i], second[i])
+                continue
+            # пересечение есть только в одном из вариантов: допустимо лишь касание края отрезка
+            point = points[i] if mask[i] else np.array(expected)
+            edges = np.concatenate((first[i], second[i]))
+            assert np.any(np.abs(edges - point) <= tolerance), (first[i], second[i], expected, points[i])
+        checked += count
+
+        lengths = np.array([rng.uniform(1, 1000) for _ in range(count)])
+        ends = make_vectors(first[:, 0], second[:, 0], lengths)
+        for i in range(count):
+            expected = make_vector_xy(*first[i, 0], *second[i, 0], lengths[i])
+            assert np.allclose(ends[i], expected, rtol=1e-12, atol=tolerance), (first[i, 0], second[i, 0])
+        checked += count
+    return checked
+
+
+if __name__ == '__main__':
+    checked = self_check()
+    print(f'{checked} batch results agree with the scalar functions')
+
+    rng = random.Random(1)
+    count = 200000
+    first = random_segments(rng, count, 100.0, False)
+    second = random_segments(rng, count, 100.0, False)
+    start = time.perf_counter()
+    for i in range(count):
+        intersect_xy(*first[i].ravel(), *second[i].ravel())
+    scalar = time.perf_counter() - start
+    start = time.perf_counter()
+    intersect_many(first, second)
+    batch = time.perf_counter() - start
+    print(f'intersect: {count / scalar:,.0f} pairs/s scalar, {count / batch:,.0f} pairs/s batch '
+          f'({scalar / batch:.0f}x)')
@@ -0,0 +1,231 @@
+"""
+Набор бенчмарков: геометрия, решение ударов и отрисовка кадра без окна (видеодрайвер SDL dummy).
+
+    python benchmark.py                      # замер и сравнение с benchmark_baseline.json
+    python benchmark.py --save-baseline      # замер и сохранение его как базового
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import timeit
+from itertools import islice
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from geometry import Point, Vector, make_vector, intersect, intersect_xy, make_vector_xy  # noqa: E402
+from model import BilliardModel  # noqa: E402
+from outcome_map import outcome_map  # noqa: E402
+from raycast import cast  # noqa: E402
+from shot_cache import ShotCache  # noqa: E402
+from solver import solve, direction  # noqa: E402
+
+BOARD_SIZES = [(5, 5), (8, 8), (10, 10), (1000, 1000)]
+
+
+def random_shots(seed, count):
+    """
+    Случайные удары на полях из диапазона игры (метка не совпадает с шаром, как в model.simulate)
+    :return: список (ширина, высота, позиция шара, позиция метки)
+    """
+    rng = random.Random(seed)
+    shots = []
+    for _ in range(count):
+        width, height = rng.randint(5, 10), rng.randint(5, 10)
+        ball = aim = (rng.randint(1, width - 1), rng.randint(1, height - 1))
+        while aim == ball:
+            aim = (rng.randint(1, width - 1), rng.randint(1, height - 1))
+        shots.append((width, height, ball, aim))
+    return shots
+
+
+def ops_per_second(func, repeat=5):
+    """
+    Число вызовов func в секунду (лучший из repeat замеров)
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return number / min(timer.repeat(repeat=repeat, number=number))
+
+
+def bench_geometry():
+    """
+    Операции в секунду для функций geometry
+    """
+    a, b = Point((10, 20)), Point((300, 400))
+    side = (Point((0, 0)), Point((800, 0)))
+    vector = Vector((Point((400, 400)), Point((100, -300))))
+    return {
+        'point_add': ops_per_second(lambda: a + b),
+        'vector_length': ops_per_second(vector.length),
+        'make_vector': ops_per_second(lambda: make_vector(a, b, 1000.0)),
+        'make_vector_xy': ops_per_second(lambda: make_vector_xy(10.0, 20.0, 300.0, 400.0, 1000.0)),
+        'intersect': ops_per_second(lambda: intersect(side, vector)),
+        'intersect_xy': ops_per_second(lambda: intersect_xy(0.0, 0.0, 800.0, 0.0, 400.0, 400.0, 100.0, -300.0)),
+    }
+
+
+def bench_shots(seed):
+    """
+    Решенных ударов в секунду разными способами
+    """
+    shots = random_shots(seed, 2000)
+    max_bounces = BilliardModel.max_bounces
+
+    def solve_all():
+        for width, height, ball, aim in shots:
+            solve(width, height, ball, aim)
+
+    def cast_all():
+        for width, height, ball, aim in shots:
+            for _ in islice(cast(ball, direction(ball, aim), (0, 0, width, height)), max_bounces):
+                pass
+
+    cache = ShotCache(maxsize=len(shots))
+
+    def cache_all():
+        for width, height, ball, aim in shots:
+            cache.get(width, height, ball, aim, max_bounces)
+
+    model = BilliardModel(800, 800)
+
+    def model_all(shot_cache):
+        model.shot_cache = shot_cache
+        for width, height, ball, aim in shots:
+            model.startup_game(width, height, ball)
+            model.play_round(aim)
+
+    boards = [(width, height, ball) for width, height, ball, _ in shots[:200]]
+
+    def outcome_map_all():
+        for width, height, ball in boards:
+            outcome_map(width, height, ball)
+
+    cache_all()
+    return {
+        'solve': ops_per_second(solve_all, repeat=3) * len(shots),
+        'raycast': ops_per_second(cast_all, repeat=3) * len(shots),
+        'shot_cache_hit': ops_per_second(cache_all, repeat=3) * len(shots),
+        'model_round_cached': ops_per_second(lambda: model_all(ShotCache()), repeat=3) * len(shots),
+        'model_round_uncached': ops_per_second(lambda: model_all(None), repeat=3) * len(shots),
+        'outcome_map_boards': ops_per_second(outcome_map_all, repeat=3) * len(boards),
+    }
+
+
+def bench_frames(seed, frames):
+    """
+    Время кадра fill + draw_board + flip (мс) во время анимации ударов на полях разного размера
+    """
+    import pygame
+    from main import Game
+
+    game = Game(800, 800)
+    rng = random.Random(seed)
+    results = {}
+    for width, height in BOARD_SIZES:
+        samples = []
+        ball = (rng.randint(1, width - 1), rng.randint(1, height - 1))
+        while len(samples) < frames:
+            game.startup_game(width, height, ball)
+            aim = ball
+            while aim == ball:
+                aim = (rng.randint(1, width - 1), rng.randint(1, height - 1))
+            game.set_aim_position(aim)
+            game.calculate_hit_lines()
+            game.hit()
+            while game.game_stage == 'animation' and len(samples) < frames:
+                start = time.perf_counter()
+                game.update()
+                game.fill()
+                game.draw_board()
+                pygame.display.flip()
+                samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        results[f'{width}x{height}'] = {'mean_ms': sum(samples) / len(samples),
+                                        'p99_ms': samples[int(len(samples) * 0.99)]}
+    pygame.quit()
+    return results
+
+
+def run(seed, frames):
+    """
+    Все бенчмарки
+    :return: словарь с результатами
+    """
+    return {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(), 'seed': seed,
+                 'frames': frames, 'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+        'geometry_ops_per_sec': bench_geometry(),
+        'shots_per_sec': bench_shots(seed),
+        'frame_time': bench_frames(seed, frames),
+    }
+
+
+def flatten(results):
+    """
+    Плоский список метрик: (имя, значение, больше - лучше)
+    """
+    metrics = []
+    for group in 'geometry_ops_per_sec', 'shots_per_sec':
+        for name, value in results[group].items():
+            metrics.append((f'{group}.{name}', value, True))
+    for board, values in results['frame_time'].items():
+        for name, value in values.items():
+            metrics.append((f'frame_time.{board}.{name}', value, False))
+    return metrics
+
+
+def compare(results, baseline, tolerance):
+    """
+    Печатает сравнение с базовым замером
+    :return: число метрик, ухудшившихся больше чем на tolerance
+    """
+    base = {name: value for name, value, _ in flatten(baseline)}
+    regressions = 0
+    print(f'{"metric":45s} {"baseline":>14s} {"current":>14s} {"change":>8s}')
+    for name, value, higher_is_better in flatten(results):
+        if name not in base:
+            print(f'{name:45s} {"-":>14s} {value:14.3f}')
+            continue
+        change = value / base[name] - 1
+        worse = -change if higher_is_better else change
+        mark = ''
+        if worse > tolerance:
+            regressions += 1
+            mark = '  REGRESSION'
+        print(f'{name:45s} {base[name]:14.3f} {value:14.3f} {change:+8.1%}{mark}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки геометрии, решения ударов и отрисовки')
+    parser.add_argument('--seed', type=int, default=2023)
+    parser.add_argument('--frames', type=int, default=600, help='кадров на каждый размер поля')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результаты как базовые')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='допустимое ухудшение (доля)')
+    args = parser.parse_args()
+
+    results = run(args.seed, args.frames)
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f'baseline saved to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        return 1 if compare(results, baseline, args.tolerance) else 0
+    for name, value, _ in flatten(results):
+        print(f'{name:45s} {value:14.3f}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,435 @@
+"""
+Экспорт удара в видео или GIF без окна.
+
+Игра рисует кадры анимации удара с постоянным шагом по времени и без ожидания кадров. Перерисовывается
+только изменившаяся часть кадра (Game.dirty_rects), остальное остается от предыдущего кадра, а неизменные
+кадры (прицел до удара и итог удара) не рисуются и не кодируются заново. Запись и сжатие кадров идут
+на потоках пула, пока рисуется следующий кадр: снимок кадра передается в канал процесса ffmpeg,
+а без ffmpeg кадры сохраняются последовательностью PNG (строки PNG обновляются только в изменившейся
+области и сжимаются zlib). В работе одновременно лишь несколько кадров, поэтому расход памяти
+не зависит от длины клипа.
+
+    python export.py --board 8 6 --ball 3 2 --aim 5 4 --output shot.mp4
+    python export.py --board 8 6 --ball 3 2 --direction 3 1 --output shot.gif
+    python export.py --board 8 6 --ball 3 2 --aim 5 4 --output frames/   # последовательность PNG
+"""
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+# окно не нужно: кадры рисуются в память
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+import main  # noqa: E402
+from main import Game  # noqa: E402
+
+# формат пикселей ffmpeg по маскам каналов 32-битной поверхности (порядок байтов little-endian)
+PIXEL_FORMATS = {
+    (0xFF0000, 0xFF00, 0xFF, 0): 'bgr0',
+    (0xFF0000, 0xFF00, 0xFF, 0xFF000000): 'bgra',
+    (0xFF, 0xFF00, 0xFF0000, 0): 'rgb0',
+    (0xFF, 0xFF00, 0xFF0000, 0xFF000000): 'rgba',
+}
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# число промежуточных оттенков между фоном и цветом сглаженного края в палитре GIF
+PALETTE_RAMP_STEPS = 12
+
+
+class ExportResult(NamedTuple):
+    """
+    Итог экспорта: число кадров, длительность клипа и время экспорта в секундах
+    """
+    frames: int
+    duration: float
+    elapsed: float
+
+
+def pixel_format(surface):
+    """
+    Формат пикселей ffmpeg, в котором байты поверхности можно передать без преобразования
+    :param surface: pygame.Surface
+    :return: имя формата или None, если поверхность нельзя передать как есть
+    """
+    if (sys.byteorder != 'little' or surface.get_bytesize() != 4 or
+            surface.get_pitch() != surface.get_width() * 4):
+        return None
+    return PIXEL_FORMATS.get(surface.get_masks())
+
+
+def board_palette(max_bounces=Game.max_bounces):
+    """
+    Постоянная палитра GIF: цвета игры (color_* модуля main и цвета отрезков траектории)
+    и оттенки сглаженных краев текста на черном фоне, на кнопках и на линиях поля
+    :param max_bounces: максимальное число касаний бортов (сколько цветов отрезков траектории)
+    :return: pygame.Surface 16x16, по пикселю на цвет палитры
+    """
+    colors = [value for name, value in vars(main).items() if name.startswith('color_')]
+    colors += [pygame.Color(i * 50, i * 50, 255 - i * 50) for i in range(max_bounces + 1)]
+    ramps = [(main.color_black, color) for color in colors]
+    ramps += [(main.color_grey_green, main.color_lighter_green), (main.color_dark_gray, main.color_light_gray),
+              (main.color_green, main.color_red), (main.color_green, main.color_white)]
+    palette = dict.fromkeys(tuple(color)[:3] for color in colors)
+    for background, color in ramps:
+        for step in range(1, PALETTE_RAMP_STEPS):
+            palette[tuple(background.lerp(color, step / PALETTE_RAMP_STEPS))[:3]] = None
+    if len(palette) > 256:
+        raise ValueError(f'GIF palette needs {len(palette)} colors, at most 256 fit')
+    surface = pygame.Surface((16, 16)).convert()
+    surface.fill(main.color_black)
+    for i, color in enumerate(palette):
+        surface.set_at((i % 16, i // 16), color)
+    return surface
+
+
+class WriteQueue:
+    """
+    Задачи записи и кодирования кадров на потоках пула: следующий кадр рисуется, пока пишутся предыдущие.
+    В работе не больше window задач - при полной очереди submit ждет самую старую, поэтому память
+    не растет с числом кадров, а ошибки записи всплывают сразу, а не в конце
+    :param workers: число потоков (1 - задачи выполняются по порядку)
+    :param window: наибольшее число задач в работе
+    """
+    def __init__(self, workers=1, window=4):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.window = window
+        self.pending = deque()
+
+    def submit(self, function, *args):
+        """
+        Отправляет задачу в пул (ждет, если в работе уже window задач)
+        :return: Future задачи
+        """
+        while len(self.pending) >= self.window:
+            self.pending.popleft().result()
+        future = self.executor.submit(function, *args)
+        self.pending.append(future)
+        return future
+
+    def wait(self):
+        """
+        Дожидается всех задач в работе (ошибка задачи выбрасывается)
+        :return: None
+        """
+        while self.pending:
+            self.pending.popleft().result()
+
+    def close(self):
+        """
+        Дожидается всех задач и останавливает потоки
+        :return: None
+        """
+        try:
+            self.wait()
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+
+
+class FFmpegWriter:
+    """
+    Кодирование кадров процессом ffmpeg: кадры пишутся в его стандартный ввод на отдельном потоке
+    :param path: путь к видео (формат по расширению: .mp4, .webm, .gif, ...)
+    :param surface: поверхность, кадры которой будут записаны (размер и формат пикселей)
+    :param fps: частота кадров
+    :param ffmpeg: путь к ffmpeg
+    :param palette: палитра GIF (поверхность из 256 пикселей, по умолчанию board_palette())
+    :param window: сколько кадров может ждать записи
+    """
+    # кадры - плоские заливки: veryfast сжимает их не хуже medium и в полтора раза быстрее
+    x264_preset = 'veryfast'
+
+    def __init__(self, path, surface, fps, ffmpeg='ffmpeg', palette=None, window=4):
+        self.source_format = pixel_format(surface)
+        self.palette_path = None
+        inputs = []
+        output = []
+        if path.lower().endswith('.gif'):
+            # постоянная палитра: paletteuse обрабатывает кадры потоком и только в изменившейся области,
+            # а палитра по всему клипу (palettegen) держала бы в памяти все кадры до конца клипа
+            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as file:
+                file.write(encode_png(board_palette() if palette is None else palette))
+            self.palette_path = file.name
+            inputs = ['-i', self.palette_path]
+            output = ['-lavfi', '[0:v][1:v]paletteuse=dither=none:diff_mode=rectangle']
+        elif path.lower().endswith(('.mp4', '.mov', '.mkv')):
+            output = ['-preset', self.x264_preset, '-pix_fmt', 'yuv420p']
+        self.process = subprocess.Popen(
+            [ffmpeg, '-loglevel', 'error', '-y', '-f', 'rawvideo',
+             '-pix_fmt', self.source_format or 'rgb24', '-s', '{}x{}'.format(*surface.get_size()),
+             '-r', str(fps), '-i', '-', *inputs, *output, path],
+            stdin=subprocess.PIPE)
+        # один поток: кадры попадают в канал по порядку
+        self.queue = WriteQueue(1, window)
+        self.frame = None
+
+    def write(self, surface, rect=None):
+        """
+        Передает кадр кодировщику. Снимок кадра (одна копия байтов поверхности) пишется в канал на потоке
+        записи; неизменный кадр не копируется - повторяется предыдущий снимок
+        :param surface: поверхность с кадром
+        :param rect: изменившаяся с прошлого кадра область, None - весь кадр, пустая - кадр не изменился
+        :return: None
+        """
+        if self.frame is None or rect is None or rect:
+            # копия обязательна: пока поток записи пишет кадр в канал, следующий кадр уже рисуется
+            # в ту же поверхность (запись представления поверхности без копии ждала бы ffmpeg на этом потоке)
+            if self.source_format:
+                self.frame = bytes(surface.get_view('0'))
+            else:
+                self.frame = pygame.image.tobytes(surface, 'RGB')
+        self.queue.submit(self.process.stdin.write, self.frame)
+
+    def close(self):
+        """
+        Дожидается окончания кодирования
+        :return: None
+        """
+        try:
+            self.queue.close()
+            self.process.stdin.close()
+        finally:
+            self.process.wait()
+            if self.palette_path:
+                os.remove(self.palette_path)
+        if self.process.returncode:
+            raise RuntimeError(f'ffmpeg exited with code {self.process.returncode}')
+
+
+def _png_chunk(kind, data):
+    """
+    Блок PNG: длина, тип, данные и контрольная сумма
+    """
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_rows(surface, rows=None, rect=None):
+    """
+    Копирует пиксели поверхности из pygame.surfarray.pixels3d в строки PNG (RGB, без фильтров строк)
+    :param surface: pygame.Surface
+    :param rows: буфер строк (высота, 1 + ширина * 3) uint8 с предыдущим кадром или None
+    :param rect: область, которую нужно обновить (None - вся поверхность)
+    :return: буфер строк
+    """
+    width, height = surface.get_size()
+    if rows is None or rows.shape != (height, 1 + width * 3):
+        # строка PNG - байт фильтра (0 - без фильтра) и пиксели RGB
+        rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+        rect = None
+    left, top, right, bottom = (0, 0, width, height) if rect is None else (rect.left, rect.top,
+                                                                          rect.right, rect.bottom)
+    pixels = pygame.surfarray.pixels3d(surface)
+    rows[:, 1:].reshape(height, width, 3)[top:bottom, left:right] = pixels[left:right, top:bottom].transpose(1, 0, 2)
+    del pixels
+    return rows
+
+
+def png_bytes(rows, size, compression=1):
+    """
+    Файл PNG из строк png_rows
+    :param rows: строки PNG (массив или байты)
+    :param size: (ширина, высота)
+    :param compression: уровень сжатия zlib (1 - быстрее всего, 9 - меньше всего)
+    :return: bytes
+    """
+    return b''.join((PNG_SIGNATURE,
+                     _png_chunk(b'IHDR', struct.pack('>IIBBBBB', *size, 8, 2, 0, 0, 0)),
+                     _png_chunk(b'IDAT', zlib.compress(rows, compression)),
+                     _png_chunk(b'IEND', b'')))
+
+
+def encode_png(surface, rows=None, compression=1):
+    """
+    Кодирует поверхность в PNG (RGB, без фильтров строк). Буфер строк rows можно использовать повторно
+    для кадров одного размера
+    :param surface: pygame.Surface
+    :param rows: буфер строк (высота, 1 + ширина * 3) uint8 или None
+    :param compression: уровень сжатия zlib (1 - быстрее всего, 9 - меньше всего)
+    :return: bytes
+    """
+    return png_bytes(png_rows(surface, rows), surface.get_size(), compression)
+
+
+class PngSequenceWriter:
+    """
+    Кадры в виде файлов frame_00000.png, frame_00001.png, ... в каталоге
+    (видео из них собирается позже, например ffmpeg -i frame_%05d.png).
+    Строки PNG обновляются только в изменившейся области кадра, сжатие и запись файлов идут на потоках пула
+    :param directory: каталог для кадров (создается при необходимости)
+    :param compression: уровень сжатия zlib (1 - быстрее всего, 9 - меньше всего)
+    :param workers: число потоков сжатия (None - по числу ядер)
+    """
+    def __init__(self, directory, compression=1, workers=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compression = compression
+        self.frames = 0
+        self.rows = None
+        # Future последнего закодированного кадра: неизменные кадры повторяют его
+        self.encoded = None
+        workers = workers or os.cpu_count()
+        self.queue = WriteQueue(workers, workers * 2)
+
+    def encode(self, data, size, path):
+        """
+        Задача потока: сжимает кадр и сохраняет его
+        :return: байты PNG
+        """
+        png = png_bytes(data, size, self.compression)
+        with open(path, 'wb') as file:
+            file.write(png)
+        return png
+
+    @staticmethod
+    def repeat(encoded, path):
+        """
+        Задача потока: сохраняет уже закодированный кадр под новым именем
+        """
+        with open(path, 'wb') as file:
+            file.write(encoded.result())
+
+    def write(self, surface, rect=None):
+        """
+        Сохраняет кадр
+        :param surface: поверхность с кадром
+        :param rect: изменившаяся с прошлого кадра область, None - весь кадр, пустая - кадр не изменился
+        :return: None
+        """
+        path = os.path.join(self.directory, f'frame_{self.frames:05d}.png')
+        if self.encoded is None or rect is None or rect:
+            self.rows = png_rows(surface, self.rows, rect)
+            # снимок строк: буфер обновляется следующим кадром, пока этот сжимается
+            self.encoded = self.queue.submit(self.encode, self.rows.tobytes(), surface.get_size(), path)
+        else:
+            self.queue.submit(self.repeat, self.encoded, path)
+        self.frames += 1
+
+    def close(self):
+        """
+        Дожидается записи всех кадров
+        :return: None
+        """
+        self.queue.close()
+
+
+def open_writer(path, surface, fps, workers=None):
+    """
+    Кодировщик по пути вывода: каталог (путь оканчивается на / или уже существующий каталог) -
+    последовательность PNG, иначе - видео через ffmpeg
+    :param workers: число потоков сжатия PNG (None - по числу ядер)
+    :return: FFmpegWriter или PngSequenceWriter
+    """
+    if path.endswith(('/', os.sep)) or os.path.isdir(path):
+        return PngSequenceWriter(path, workers=workers)
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg not found: install it or export a PNG sequence into a directory')
+    return FFmpegWriter(path, surface, fps, ffmpeg)
+
+
+def render_shot(game, writer, fps, lead=0.5, hold=1.0):
+    """
+    Рисует удар игры с выбранным прицелом: прицел до удара, анимацию и итог удара.
+    В каждом кадре перерисовывается только область Game.dirty_rects
+    :param game: Game с выбранной меткой или направлением удара
+    :param writer: кодировщик кадров
+    :param fps: частота кадров
+    :param lead: сколько секунд показывать прицел до удара
+    :param hold: сколько секунд показывать итог удара
+    :return: число кадров
+    """
+    frames = 0
+    # шаг кадра не ограничивается max_frame_time: при малой частоте кадров анимация не замедляется
+    game.max_frame_time = max(game.max_frame_time, 1 / fps)
+    unchanged = pygame.Rect(0, 0, 0, 0)
+
+    def frame():
+        nonlocal frames
+        rects = game.dirty_rects()
+        rect = rects[0].unionall(rects[1:]).clip(game.surface.get_rect()) if rects else unchanged
+        if rect:
+            game.draw_board(rect)
+        writer.write(game.surface, rect)
+        frames += 1
+
+    for _ in range(round(lead * fps)):
+        frame()
+    game.press_hit()
+    while game.game_stage == 'animation':
+        game.update(1 / fps)
+        frame()
+    for _ in range(round(hold * fps)):
+        frame()
+    return frames
+
+
+def export(path, width_in_cells, height_in_cells, ball, aim=None, aim_direction=None, fps=60, size=800,
+           lead=0.5, hold=1.0, workers=None):
+    """
+    Экспортирует удар по метке aim или в направлении aim_direction
+    :param path: путь к видео или каталог для последовательности PNG
+    :param width_in_cells: ширина игрового поля в клетках
+    :param height_in_cells: высота игрового поля в клетках
+    :param ball: позиция шара в клетках
+    :param aim: позиция метки прицеливания в клетках
+    :param aim_direction: направление свободного удара (вместо метки)
+    :param fps: частота кадров
+    :param size: размер кадра в пикселях
+    :param lead: сколько секунд показывать прицел до удара
+    :param hold: сколько секунд показывать итог удара
+    :param workers: число потоков сжатия PNG (None - по числу ядер)
+    :return: ExportResult
+    """
+    start = time.perf_counter()
+    game = Game(size, size, 'Export')
+    # указателя мыши нет: подсветка метки и предпросмотр по его позиции (0, 0) в клип не попадают
+    game.set_track_pointer(False)
+    game.startup_game(width_in_cells, height_in_cells, ball)
+    if aim_direction is not None:
+        game.set_free_aim(True)
+        game.select_direction(aim_direction)
+    else:
+        game.select_aim(aim)
+    writer = open_writer(path, game.surface, fps, workers)
+    try:
+        frames = render_shot(game, writer, fps, lead, hold)
+    finally:
+        writer.close()
+    return ExportResult(frames, frames / fps, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Экспорт удара в видео, GIF или последовательность PNG')
+    parser.add_argument('--board', type=int, nargs=2, required=True, metavar=('WIDTH', 'HEIGHT'),
+                        help='размер поля в клетках')
+    parser.add_argument('--ball', type=int, nargs=2, required=True, metavar=('X', 'Y'))
+    aim_group = parser.add_mutually_exclusive_group(required=True)
+    aim_group.add_argument('--aim', type=int, nargs=2, metavar=('X', 'Y'), help='метка прицеливания')
+    aim_group.add_argument('--direction', type=int, nargs=2, metavar=('DX', 'DY'),
+                           help='направление свободного удара')
+    parser.add_argument('--output', required=True,
+                        help='файл видео (.mp4, .webm, .gif - нужен ffmpeg) или каталог для PNG (оканчивается на /)')
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--size', type=int, default=800, help='размер кадра в пикселях')
+    parser.add_argument('--hold', type=float, default=1.0, help='сколько секунд показывать итог удара')
+    parser.add_argument('--workers', type=int, help='число потоков сжатия PNG (по умолчанию - по числу ядер)')
+    args = parser.parse_args()
+
+    result = export(args.output, *args.board, tuple(args.ball),
+                    aim=tuple(args.aim) if args.aim else None,
+                    aim_direction=tuple(args.direction) if args.direction else None,
+                    fps=args.fps, size=args.size, hold=args.hold, workers=args.workers)
+    print(f'{result.frames} frames ({result.duration:.1f} s of video) exported to {args.output} '
+          f'in {result.elapsed:.2f} s ({result.duration / result.elapsed:.1f}x real time)')
@@ -0,0 +1,318 @@
+"""
+Дифференциальная проверка расчета траекторий на случайных ударах.
+
+Эталон - пошаговое отражение шара от бортов в точных дробях (fractions.Fraction), без развертки стола
+и без допусков: угол засчитывается, только если шар приходит в него точно. Проверяемый путь - то,
+чем пользуется игра (model.hit_lines): решение удара solver.solve и кэш траекторий для ударов по меткам,
+raycast.cast для свободного прицеливания. Сравниваются луза и точки касания бортов.
+
+Удары генерируются по зерну и проверяются на пуле процессов; найденное расхождение
+уменьшается до минимального удара с тем же расхождением.
+
+    python fuzz.py --cases 1000000 --max-cells 40
+    python fuzz.py --case 8 6 3 2 5 4            # проверить один удар по метке (5, 4)
+    python fuzz.py --case 8 6 3 2 3 1 --free     # свободный удар в направлении (3, 1)
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from fractions import Fraction
+from multiprocessing import Pool
+from typing import NamedTuple
+
+from model import BilliardModel, solved_hit_lines
+from shot_cache import ShotCache
+
+# допустимая ошибка точки касания борта относительно размера поля
+TOLERANCE = 1e-9
+# ударов в одной части проверки: части и их зерна не зависят от числа процессов,
+# поэтому зерно задает один и тот же набор ударов
+CHUNK_SIZE = 1000
+# сколько расхождений запоминает каждая часть проверки
+KEEP_FAILURES = 3
+
+
+class Case(NamedTuple):
+    """
+    Удар: поле width x height, шар ball и метка aim (в клетках)
+    free - свободное прицеливание: aim - направление удара, а не метка
+    """
+    width: int
+    height: int
+    ball: tuple
+    aim: tuple
+    free: bool
+
+
+class FuzzResult(NamedTuple):
+    """
+    Итог проверки: число ударов, расхождения (Case, описание) и время в секундах
+    """
+    cases: int
+    failures: list
+    elapsed: float
+
+
+def pocket_size():
+    """
+    Размер лузы в клетках при свободном прицеливании (как в BilliardModel.hit_lines_args)
+    :return: Fraction
+    """
+    return Fraction(BilliardModel.pocket_radius, BilliardModel.cell_size + BilliardModel.inner_line_thickness)
+
+
+def reference(case, limit):
+    """
+    Точное решение удара отражениями в дробях
+    :param case: Case
+    :param limit: максимальное число касаний бортов
+    :return: (точки касания (Fraction, Fraction), индекс лузы или None)
+    """
+    width, height = case.width, case.height
+    x, y = Fraction(case.ball[0]), Fraction(case.ball[1])
+    if case.free:
+        dx, dy = case.aim
+        size = pocket_size()
+    else:
+        dx, dy = case.aim[0] - case.ball[0], case.aim[1] - case.ball[1]
+        if dx == dy == 0:
+            dx, dy = 0, 1
+        size = 0
+    points = []
+    while len(points) < limit:
+        tx = (width - x) / dx if dx > 0 else -x / dx if dx < 0 else None
+        ty = (height - y) / dy if dy > 0 else -y / dy if dy < 0 else None
+        if tx is not None and tx == ty:
+            x, y = (width if dx > 0 else 0), (height if dy > 0 else 0)
+            points.append((Fraction(x), Fraction(y)))
+            return points, (x == width) + (y == height) * 2
+        if ty is None or (tx is not None and tx < ty):
+            x, y = Fraction(width if dx > 0 else 0), y + dy * tx
+            dx = -dx
+            near = min(y, height - y) <= size
+            pocket = (x == width) + (height - y < y) * 2
+        else:
+            x, y = x + dx * ty, Fraction(height if dy > 0 else 0)
+            dy = -dy
+            near = min(x, width - x) <= size
+            pocket = (width - x < x) + (y == height) * 2
+        points.append((x, y))
+        if size and near:
+            return points, pocket
+    return points, None
+
+
+def production(case, limit, shot_cache):
+    """
+    Решение удара тем же путем, что в игре (model.hit_lines)
+    :return: (точки касания, индекс лузы или None)
+    """
+    aim_position, aim_direction = (None, case.aim) if case.free else (case.aim, None)
+    return solved_hit_lines(case.width, case.height, case.ball, aim_position, aim_direction, limit,
+                            float(pocket_size()), shot_cache)
+
+
+def compare(case, limit=BilliardModel.max_bounces, shot_cache=None):
+    """
+    Сравнивает проверяемый путь с эталоном
+    :param case: Case
+    :param limit: максимальное число касаний бортов (включая попадание в лузу)
+    :param shot_cache: кэш траекторий ShotCache или None
+    :return: описание расхождения или None
+    """
+    try:
+        points, pocket = production(case, limit, shot_cache)
+    except Exception as error:
+        return f'{type(error).__name__}: {error}'
+    expected_points, expected_pocket = reference(case, limit)
+    if pocket != expected_pocket:
+        return f'pocket {pocket}, expected {expected_pocket}'
+    if len(points) != len(expected_points):
+        return f'{len(points)} bounces, expected {len(expected_points)}'
+    tolerance = TOLERANCE * (case.width + case.height)
+    for i, (point, expected) in enumerate(zip(points, expected_points)):
+        if abs(point[0] - expected[0]) > tolerance or abs(point[1] - expected[1]) > tolerance:
+            return f'bounce {i}: {point}, expected ({float(expected[0])}, {float(expected[1])})'
+    return None
+
+
+def random_case(rng, min_cells, max_cells, free_share):
+    """
+    Случайный удар: поле, шар на пересечении, метка на другом пересечении или направление.
+    На поле 2x2 внутреннее пересечение одно, и удар всегда свободный
+    :param min_cells: наименьший размер поля в клетках, не меньше 2
+    :return: Case
+    """
+    width = rng.randint(min_cells, max_cells)
+    height = rng.randint(min_cells, max_cells)
+    ball = rng.randrange(1, width), rng.randrange(1, height)
+    if rng.random() < free_share or width == height == 2:
+        limit = max(width, height)
+        aim = (0, 0)
+        while aim == (0, 0):
+            aim = rng.randint(-limit, limit), rng.randint(-limit, limit)
+        return Case(width, height, ball, aim, True)
+    aim = ball
+    while aim == ball:
+        aim = rng.randrange(1, width), rng.randrange(1, height)
+    return Case(width, height, ball, aim, False)
+
+
+def valid(case):
+    """
+    Возвращает True, если удар допустим: шар и метка - внутренние пересечения поля, метка не под шаром,
+    направление ненулевое
+    """
+    width, height, ball, aim, free = case
+    points = (ball,) if free else (ball, aim)
+    if not all(0 < x < width and 0 < y < height for x, y in points):
+        return False
+    return aim != (0, 0) if free else aim != ball
+
+
+def _toward(value, target):
+    """
+    Значения между target и value, от самого дальнего от value: target, середина, ... , соседнее с value
+    """
+    step = value - target
+    while step:
+        yield value - step
+        step = int(step / 2)
+
+
+def candidates(case):
+    """
+    Удары проще case: меньше поле, шар и метка ближе к углу, короче направление
+    :return: генератор допустимых Case
+    """
+    values = [case.width, case.height, *case.ball, *case.aim]
+    # нижние границы: поле 2x2, шар и метка на пересечении (1, 1), направление - к нулю
+    targets = [2, 2, 1, 1] + ([0, 0] if case.free else [1, 1])
+    for index, (value, target) in enumerate(zip(values, targets)):
+        for new_value in _toward(value, target):
+            changed = values[:index] + [new_value] + values[index + 1:]
+            candidate = Case(changed[0], changed[1], tuple(changed[2:4]), tuple(changed[4:6]), case.free)
+            if valid(candidate):
+                yield candidate
+
+
+def shrink(case, limit=BilliardModel.max_bounces, shot_cache=None):
+    """
+    Уменьшает удар с расхождением, пока расхождение сохраняется
+    :param case: Case с расхождением
+    :return: (минимальный Case, описание расхождения)
+    """
+    failure = compare(case, limit, shot_cache)
+    progress = True
+    while progress:
+        progress = False
+        for candidate in candidates(case):
+            candidate_failure = compare(candidate, limit, shot_cache)
+            if candidate_failure:
+                case, failure = candidate, candidate_failure
+                progress = True
+                break
+    return case, failure
+
+
+def _fuzz_chunk(task):
+    """
+    Задача процесса пула: проверка части ударов
+    :return: (число ударов, список расхождений (Case, описание))
+    """
+    seed, chunk, count, min_cells, max_cells, free_share, use_cache = task
+    rng = random.Random(f'{seed}:{chunk}')
+    shot_cache = ShotCache() if use_cache else None
+    failures = []
+    for _ in range(count):
+        case = random_case(rng, min_cells, max_cells, free_share)
+        failure = compare(case, BilliardModel.max_bounces, shot_cache)
+        if failure and len(failures) < KEEP_FAILURES:
+            failures.append((case, failure))
+    return count, failures
+
+
+def run(cases, seed=0, workers=None, min_cells=BilliardModel.min_cells, max_cells=BilliardModel.max_cells,
+        free_share=0.5, use_cache=True, progress=None):
+    """
+    Проверяет cases случайных ударов на пуле процессов
+    :param cases: число ударов
+    :param seed: зерно генератора ударов (результат не зависит от числа процессов)
+    :param workers: число процессов (None - по числу ядер, 1 - в текущем процессе)
+    :param min_cells: наименьший размер поля в клетках
+    :param max_cells: наибольший размер поля в клетках
+    :param free_share: доля ударов со свободным прицеливанием
+    :param use_cache: проверять удары по меткам через кэш траекторий, как в игре
+    :param progress: функция (проверено ударов, найдено расхождений), вызываемая по мере проверки
+    :return: FuzzResult
+    """
+    workers = workers or os.cpu_count()
+    tasks = [(seed, chunk, min(CHUNK_SIZE, cases - start), min_cells, max_cells, free_share, use_cache)
+             for chunk, start in enumerate(range(0, cases, CHUNK_SIZE))]
+    start = time.perf_counter()
+    done = 0
+    failures = []
+    if workers == 1:
+        results = map(_fuzz_chunk, tasks)
+        pool = None
+    else:
+        pool = Pool(workers)
+        results = pool.imap_unordered(_fuzz_chunk, tasks)
+    try:
+        for count, chunk_failures in results:
+            done += count
+            failures += chunk_failures
+            if progress:
+                progress(done, len(failures))
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return FuzzResult(done, failures, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Сравнение расчета траекторий с точным решением в дробях')
+    parser.add_argument('--cases', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию - по числу ядер)')
+    parser.add_argument('--min-cells', type=int, default=BilliardModel.min_cells)
+    parser.add_argument('--max-cells', type=int, default=BilliardModel.max_cells)
+    parser.add_argument('--free-share', type=float, default=0.5, help='доля ударов со свободным прицеливанием')
+    parser.add_argument('--no-cache', action='store_true', help='решать удары по меткам без кэша траекторий')
+    parser.add_argument('--case', type=int, nargs=6, metavar=('W', 'H', 'X', 'Y', 'AX', 'AY'),
+                        help='проверить один удар: поле, шар и метка (или направление с --free)')
+    parser.add_argument('--free', action='store_true')
+    args = parser.parse_args()
+    if not args.case and not 2 <= args.min_cells <= args.max_cells:
+        parser.error('--min-cells must be at least 2 and not greater than --max-cells')
+    shot_cache = None if args.no_cache else ShotCache()
+
+    if args.case:
+        width, height, x, y, aim_x, aim_y = args.case
+        case = Case(width, height, (x, y), (aim_x, aim_y), args.free)
+        expected = reference(case, BilliardModel.max_bounces)
+        print('reference: ', [(float(px), float(py)) for px, py in expected[0]], 'pocket', expected[1])
+        actual = production(case, BilliardModel.max_bounces, shot_cache)
+        print('production:', list(actual[0]), 'pocket', actual[1])
+        failure = compare(case, BilliardModel.max_bounces, shot_cache)
+        print(failure or 'match')
+        sys.exit(1 if failure else 0)
+
+    def report(done, failed):
+        print(f'\r{done:,} cases, {failed} failures', end='', file=sys.stderr)
+
+    result = run(args.cases, args.seed, args.workers, args.min_cells, args.max_cells, args.free_share,
+                 not args.no_cache, report)
+    print(file=sys.stderr)
+    print(f'{result.cases:,} cases in {result.elapsed:.1f} s ({result.cases / result.elapsed:,.0f} cases/s, '
+          f'{args.workers or os.cpu_count()} workers), {len(result.failures)} failures')
+    for case, failure in result.failures:
+        small, small_failure = shrink(case, BilliardModel.max_bounces, shot_cache)
+        flags = ' --free' if small.free else ''
+        print(f'{case}: {failure}')
+        print(f'  minimal: python fuzz.py --case {small.width} {small.height} {small.ball[0]} {small.ball[1]} '
+              f'{small.aim[0]} {small.aim[1]}{flags}   # {small_failure}')
+    sys.exit(1 if result.failures else 0)
@@ -1,25 +1,55 @@
 import math
 
+# создание экземпляра без вызова __init__ (быстрые пути арифметики)
+_new = object.__new__
+
 
 class Point:
     """
     Класс описывает точку на плоскости
     """
+    __slots__ = ('x', 'y')
+
     def __init__(self, point_t=(0, 0)):
         self.x = float(point_t[0])
         self.y = float(point_t[1])
 
+    @classmethod
+    def from_xy(cls, x, y):
+        """
+        Быстрое создание точки из координат без проверки типов
+        :param x: координата x (float)
+        :param y: координата y (float)
+        :return: Point
+        """
+        point = _new(cls)
+        point.x = x
+        point.y = y
+        return point
+
     def __add__(self, other):
-        return Point((self.x + other.x, self.y + other.y))
+        point = _new(Point)
+        point.x = self.x + other.x
+        point.y = self.y + other.y
+        return point
 
     def __sub__(self, other):
-        return Point((self.x - other.x, self.y - other.y))
+        point = _new(Point)
+        point.x = self.x - other.x
+        point.y = self.y - other.y
+        return point
 
     def __mul__(self, scalar):
-        return Point((self.x * scalar, self.y * scalar))
+        point = _new(Point)
+        point.x = self.x * scalar
+        point.y = self.y * scalar
+        return point
 
     def __truediv__(self, scalar):
-        return Point((self.x / scalar, self.y / scalar))
+        point = _new(Point)
+        point.x = self.x / scalar
+        point.y = self.y / scalar
+        return point
 
     def __len__(self):
         return 2
@@ -28,8 +58,7 @@ class Point:
         return self.y if key % 2 else self.x
 
     def __iter__(self):
-        yield self.x
-        yield self.y
+        return iter((self.x, self.y))
 
     def __str__(self):
         return str((self.x, self.y))
@@ -45,6 +74,8 @@ class Vector:
     """
     Класс описывает отрезок на плоскости
     """
+    __slots__ = ('start', 'end')
+
     def __init__(self, vector: (Point, Point)):
         self.start = vector[0]
         self.end = vector[1]
@@ -56,14 +87,31 @@ class Vector:
         return self.end if key % 2 else self.start
 
     def __iter__(self):
-        yield self.start
-        yield self.end
+        return iter((self.start, self.end))
 
     def __str__(self):
         return str((self.start, self.end))
 
     def length(self):
-        return math.sqrt((self.end.x - self.start.x) ** 2 + (self.end.y - self.start.y) ** 2)
+        return math.hypot(self.end.x - self.start.x, self.end.y - self.start.y)
+
+
+def make_vector_xy(x1, y1, x2, y2, length):
+    """
+    Быстрый вариант make_vector на числах: конец отрезка из точки (x1, y1) через точку (x2, y2) длины length
+    :return: (x, y) - конец отрезка
+    """
+    if x2 != x1:
+        k = (y2 - y1) / (x2 - x1)
+        b = length / math.sqrt(1 + k * k)
+        a = b * k
+        direction = -1 if x1 > x2 else 1
+    else:
+        # вертикальная прямая
+        b = 0
+        a = length
+        direction = -1 if y1 > y2 else 1
+    return x1 + b * direction, y1 + a * direction
 
 
 def make_vector(start_point: Point, aiming_point: Point, length: float) -> Vector:
@@ -74,21 +122,54 @@ def make_vector(start_point: Point, aiming_point: Point, length: float) -> Vecto
     :param length:
     :return:
     """
-    if aiming_point.x != start_point.x:
-        k = (aiming_point.y - start_point.y) / (aiming_point.x - start_point.x)
-        alpha = math.atan(k)
-        b = length * math.cos(alpha)
-        a = b * k
-        direction = -1 if start_point.x > aiming_point.x else 1
-    else:
-        # вертикальная прямая
-        b = 0
-        a = length
-        direction = -1 if start_point.y > aiming_point.y else 1
+    end_point = _new(Point)
+    end_point.x, end_point.y = make_vector_xy(start_point.x, start_point.y, aiming_point.x, aiming_point.y, length)
+    return Vector((start_point, end_point))
 
-    x2 = start_point.x + b * direction
-    y2 = start_point.y + a * direction
-    return Vector((start_point, Point((x2, y2))))
+
+def dashes_xy(x1, y1, x2, y2, dash_length, start=0, stop=None):
+    """
+    Черты пунктирной линии от (x1, y1) до (x2, y2)
+    :param start: начало видимого участка линии (расстояние от (x1, y1))
+    :param stop: конец видимого участка линии (None - до конца линии)
+    :return: генератор пар точек-кортежей (начало черты, конец черты); черты вне участка пропускаются
+    """
+    dx = x2 - x1
+    dy = y2 - y1
+    length = int(math.sqrt(dx * dx + dy * dy))
+    dx /= length
+    dy /= length
+    count = length // dash_length
+    if stop is not None:
+        count = min(count, int(stop // dash_length) + 1)
+    first = max(0, int(start // dash_length) - 1)
+    for index in range(first - first % 2, count, 2):
+        start = index * dash_length
+        end = start + dash_length
+        yield (x1 + dx * start, y1 + dy * start), (x1 + dx * end, y1 + dy * end)
+
+
+def clip_segment_xy(x1, y1, x2, y2, left, top, right, bottom):
+    """
+    Часть отрезка внутри прямоугольника (алгоритм Лианга-Барски)
+    :return: (t0, t1) - доли длины отрезка от (x1, y1), между которыми он внутри прямоугольника, или None
+    """
+    t0, t1 = 0.0, 1.0
+    dx = x2 - x1
+    dy = y2 - y1
+    for p, q in ((-dx, x1 - left), (dx, right - x1), (-dy, y1 - top), (dy, bottom - y1)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            t0 = max(t0, t)
+        else:
+            t1 = min(t1, t)
+        if t0 > t1:
+            return None
+    return t0, t1
 
 
 def intersect(line_1: Vector, line_2: Vector) -> [Point, None]:
@@ -100,7 +181,15 @@ def intersect(line_1: Vector, line_2: Vector) -> [Point, None]:
     """
     (x1, y1), (x2, y2) = line_1
     (x3, y3), (x4, y4) = line_2
+    point = intersect_xy(x1, y1, x2, y2, x3, y3, x4, y4)
+    return Point(point) if point else None
 
+
+def intersect_xy(x1, y1, x2, y2, x3, y3, x4, y4):
+    """
+    Быстрый вариант intersect на числах: отрезки (x1, y1)-(x2, y2) и (x3, y3)-(x4, y4)
+    :return: (x, y) - точка пересечения отрезков или None
+    """
     if (x1 != x2) and (x3 != x4):
         k1 = (y1 - y2) / (x1 - x2)
         b1 = y1 - k1 * x1
@@ -111,18 +200,18 @@ def intersect(line_1: Vector, line_2: Vector) -> [Point, None]:
             y = (k2 * b1 - k1 * b2) / (k2 - k1)
             if (min(x1, x2) <= x <= max(x1, x2)) and (min(x3, x4) <= x <= max(x3, x4)) and (
                     min(y1, y2) <= y <= max(y1, y2)) and (min(y3, y4) <= y <= max(y3, y4)):
-                return Point((x, y))
+                return x, y
             else:
                 return None
         else:
             if b1 == b2:
                 if max(min(x1, x2), min(x3, x4)) < min(max(x1, x2), max(x3, x4)):
                     # multiple solution
-                    return Point((max(min(x1, x2), min(x3, x4)), max(min(y1, y2), min(y3, y4))))
+                    return max(min(x1, x2), min(x3, x4)), max(min(y1, y2), min(y3, y4))
                     # min(max(x1,x2),max(x3,x4)), min(max(y1,y2),max(y3,y4))
                 else:
                     if max(min(x1, x2), min(x3, x4)) == min(max(x1, x2), max(x3, x4)):
-                        return Point((max(min(x1, x2), min(x3, x4)), max(min(y1, y2), min(y3, y4))))
+                        return max(min(x1, x2), min(x3, x4)), max(min(y1, y2), min(y3, y4))
                     else:
                         return None
             else:
@@ -141,18 +230,18 @@ def intersect(line_1: Vector, line_2: Vector) -> [Point, None]:
             y = k * x + b
             if (min(x1, x2) <= x <= max(x1, x2)) and (min(x3, x4) <= x <= max(x3, x4)) and (
                     min(y1, y2) <= y <= max(y1, y2)) and (min(y3, y4) <= y <= max(y3, y4)):
-                return Point((x, y))
+                return x, y
             else:
                 return None
         else:
             if (x1 == x2) and (x3 == x4) and (x1 == x3):
                 if max(min(y1, y2), min(y3, y4)) < min(max(y1, y2), max(y3, y4)):
                     # multiple solution
-                    return Point((x1, max(min(y1, y2), min(y3, y4))))
+                    return x1, max(min(y1, y2), min(y3, y4))
                     # min(max(y1, y2), max(y3, y4))
                 else:
                     if max(min(y1, y2), min(y3, y4)) == min(max(y1, y2), max(y3, y4)):
-                        return Point((x1, max(min(y1, y2), min(y3, y4))))
+                        return x1, max(min(y1, y2), min(y3, y4))
                     else:
                         return None
             else:
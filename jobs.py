@@ -0,0 +1,131 @@
+"""
+Выполнение долгих расчетов (решение ударов, анализ поля, симуляция) вне игрового цикла.
+
+Задание отправляется в пул потоков (или процессов) под ключом. Новое задание с тем же ключом отменяет
+предыдущее: если оно еще не началось, оно снимается с очереди, а если уже выполняется, его результат
+отбрасывается. Готовые результаты складываются в очередь, которую игровой цикл разбирает каждый кадр
+методом poll, не дожидаясь расчета.
+"""
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import NamedTuple
+
+
+class JobResult(NamedTuple):
+    """
+    Результат задания
+    key - ключ задания, job - номер задания
+    value - результат функции задания (None при ошибке), error - исключение или None
+    elapsed - время выполнения в секундах
+    """
+    key: object
+    job: int
+    value: object
+    error: BaseException
+    elapsed: float
+
+
+def _timed(function, args):
+    """
+    Выполняет функцию задания с замером времени
+    :return: (результат, время выполнения в секундах)
+    """
+    start = time.perf_counter()
+    value = function(*args)
+    return value, time.perf_counter() - start
+
+
+class JobScheduler:
+    """
+    Пул для заданий с отменой по ключу и доставкой результатов через очередь
+    :param workers: число потоков или процессов пула
+    :param processes: True - пул процессов (функции и аргументы должны сериализоваться pickle)
+    :param notify: функция без аргументов, вызываемая в потоке пула при готовности результата
+        (например, чтобы разбудить игровой цикл, ожидающий событий)
+    """
+    def __init__(self, workers=1, processes=False, notify=None):
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        self.executor = executor(max_workers=workers)
+        self.processes = processes
+        self.notify = notify
+        self.results = queue.SimpleQueue()
+        # ключ -> (номер задания, Future) последнего отправленного задания
+        self.current = {}
+        self.jobs = 0
+        self.cancelled = 0
+
+    def submit(self, key, function, *args):
+        """
+        Отправляет задание в пул, отменяя предыдущее задание с тем же ключом
+        :param key: ключ задания
+        :param function: функция задания
+        :param args: аргументы функции
+        :return: номер задания
+        """
+        self.cancel(key)
+        self.jobs += 1
+        job = self.jobs
+        future = self.executor.submit(_timed, function, args)
+        self.current[key] = job, future
+        future.add_done_callback(lambda done: self.finished(key, job, done))
+        return job
+
+    def finished(self, key, job, future):
+        """
+        Вызывается в потоке пула (или сразу при отмене): кладет результат в очередь
+        """
+        if future.cancelled():
+            return
+        error = future.exception()
+        value, elapsed = (None, 0.0) if error else future.result()
+        self.results.put(JobResult(key, job, value, error, elapsed))
+        if self.notify:
+            self.notify()
+
+    def cancel(self, key):
+        """
+        Отменяет текущее задание с ключом key: результат уже начатого задания будет отброшен
+        :param key: ключ задания
+        :return: True, если было что отменять
+        """
+        current = self.current.pop(key, None)
+        if current is None:
+            return False
+        current[1].cancel()
+        self.cancelled += 1
+        return True
+
+    def pending(self, key):
+        """
+        Возвращает True, если результат задания с ключом key еще не получен
+        :param key: ключ задания
+        :return: True или False
+        """
+        return key in self.current
+
+    def poll(self):
+        """
+        Готовые результаты текущих заданий (без ожидания). Результаты отмененных заданий пропускаются
+        :return: список JobResult
+        """
+        results = []
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return results
+            current = self.current.get(result.key)
+            if current is None or current[0] != result.job:
+                continue
+            del self.current[result.key]
+            results.append(result)
+
+    def shutdown(self):
+        """
+        Отменяет все задания и останавливает пул (выполняемые задания не прерываются)
+        :return: None
+        """
+        for key in list(self.current):
+            self.cancel(key)
+        self.executor.shutdown(wait=False, cancel_futures=True)
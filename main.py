@@ -1,7 +1,23 @@
+import startup_clock  # первым: запоминает момент начала запуска для --startup-time
+
+import argparse
+import logging
+import math
+import os
 import random
+import time
+
 import pygame
 
-from geometry import Point, Vector, make_vector, intersect
+from geometry import Point, clip_segment_xy, dashes_xy
+from jobs import JobScheduler
+from model import BilliardModel
+from profiler import FrameProfiler
+from puzzle_index import DIFFICULTIES, PuzzleIndex
+from replay import AIM, AIM_DIRECTION, HIT, NEXT, SEED_RANGE, InputRecorder
+from text_cache import text_cache
+
+logger = logging.getLogger(__name__)
 
 color_white = pygame.Color(255, 255, 255)
 color_black = pygame.Color(0, 0, 0)
@@ -32,27 +48,29 @@ class Button:
     def disable(self):
         self.enabled = False
 
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
+        x = self.x - offset[0]
+        y = self.y - offset[1]
         pygame.draw.rect(surface=surface,
                          color=color_grey_green if self.enabled else color_dark_gray,
-                         rect=(self.x, self.y, self.width, self.height),
+                         rect=(x, y, self.width, self.height),
                          border_radius=5,
                          width=0)
 
         pygame.draw.rect(surface=surface,
                          color=color_lighter_green if self.enabled else color_light_gray,
-                         rect=(self.x, self.y, self.width, self.height),
+                         rect=(x, y, self.width, self.height),
                          border_radius=5,
                          width=3)
 
         if self.text != '':
-            font = pygame.font.SysFont(self.font, 40)
-            text = font.render(self.text,
-                               1,
-                               color_lighter_green if self.enabled else color_light_gray)
+            text = text_cache.render(self.text,
+                                     self.font,
+                                     40,
+                                     color_lighter_green if self.enabled else color_light_gray)
             surface.blit(text,
-                         (self.x + (self.width // 2 - text.get_width() // 2),
-                          self.y + (self.height // 2 - text.get_height() // 2)))
+                         (x + (self.width // 2 - text.get_width() // 2),
+                          y + (self.height // 2 - text.get_height() // 2)))
 
     def mouse_is_over(self, pos):
         if not self.enabled:
@@ -64,117 +82,383 @@ class Button:
         return False
 
 
-class Game:
-    cell_size = 50
-
-    inner_line_thickness = 1
-    border_line_thickness = 5
-    pocket_radius = 20
-    ball_radius = 18
-    intersections_radius = 10
-
+class Game(BilliardModel):
     intersection_color = color_light_green
     target_color = color_red
+    hover_color = color_white
+    hover_width = 2
 
     buttons_height = 40
     buttons_width = 160
-
-    def __init__(self, width, height, caption='My Game', font=None):
-        self.game_stage = 'select_aim'
-        self.scores = 0
-        self.hit_it = None
-        self.ball_in_pocket = None
-        self.intersect_points = []
-        self.board_corners = None
-        self.board_sides = None
-        self.aim_position = None
-        self.aim_coordinates = None
-        self.boll_coordinates = None
-        self.boll_position = None
-        self.hit_path_len = None
-        self.pocket_coordinates = None
-        self.height_in_cells = None
-        self.width_in_cells = None
-        self.intersections_coordinates = {}
-        self.board_y = None
-        self.board_x = None
-        self.board_height = None
-        self.board_width = None
-        self.width = width
-        self.height = height
+    # высота полосы интерфейса внизу окна (кнопки и очки)
+    hud_height = 100
+    background_color = color_black
+    # запас вокруг участка траектории при обновлении части окна (толщина линии и сглаживание)
+    trajectory_margin = 4
+
+    # оверлей профилировщика: период обновления (с), ширина, высота строки и размер шрифта
+    overlay_interval = 0.5
+    overlay_width = 460
+    overlay_line_height = 18
+    overlay_font_size = 20
+    overlay_color = color_white
+    overlay_background = pygame.Color(0, 0, 0, 190)
+
+    # вид на поле: экранная точка = (точка разметки модели - (view_x, view_y)) * zoom
+    zoom_min = 0.1
+    zoom_max = 4.0
+    zoom_step = 1.25
+    # сдвиг вида клавишами (доля окна) и запас вокруг поля, до которого его можно сдвинуть
+    scroll_step = 0.25
+    view_margin = 40
+    # при меньшем экранном радиусе метки пересечений не рисуются, при меньшем шаге - линии сетки
+    marker_min_radius = 2
+    grid_min_step = 3
+
+    # предпросмотр траектории при свободном прицеливании: толщина линии и наибольшее значение направления
+    preview_width = 1
+    direction_limit = 32767
+
+    def __init__(self, width, height, caption='My Game', font=None, seed=None):
+        self.static_layer = None
+        self.hud_layer = None
+        self.hud_layer_state = None
+        self.full_redraw = True
+        self.drawn_path_len = None
+        self.drawn_win = False
+        self.hover_position = None
+        self.drawn_hover_position = None
+        # подсветка метки и предпросмотр траектории следуют за указателем мыши (без окна - выключаются)
+        self.track_pointer = True
+        self.profiler = FrameProfiler()
+        self.overlay_enabled = False
+        self.overlay_lines = []
+        self.overlay_surface = None
+        self.overlay_time = -math.inf
+        self.view_x = 0
+        self.view_y = 0
+        self.zoom = 1
+        self.marker_sprites = {}
+        self.free_aim = False
+        self.preview_direction = None
+        self.preview = None
+        # планировщик расчетов вне игрового цикла (None - траектория рассчитывается сразу)
+        self.jobs = None
+        self.solving = False
         size = width, height
-        pygame.init()
+        # игре нужны только окно и шрифты: звук, джойстики и прочие подсистемы не запускаем
+        pygame.display.init()
+        pygame.font.init()
         self.font = font
         self.surface = pygame.display.set_mode(size)
         pygame.display.set_caption(caption)
 
-        self.hit_button = Button((self.width - (self.buttons_width * 2)) // 3,
-                                 self.height - self.buttons_height - 20,
+        self.hit_button = Button((width - (self.buttons_width * 2)) // 3,
+                                 height - self.buttons_height - 20,
                                  self.buttons_width,
                                  self.buttons_height,
                                  'Hit it!')
-        self.new_button = Button((self.width - (self.buttons_width * 2)) // 3 * 2 + self.buttons_width,
-                                 self.height - self.buttons_height - 20,
+        self.new_button = Button((width - (self.buttons_width * 2)) // 3 * 2 + self.buttons_width,
+                                 height - self.buttons_height - 20,
                                  self.buttons_width,
                                  self.buttons_height,
                                  'Next')
 
-        self.startup_game(*self.get_random_game_parameters())
+        super().__init__(width, height, seed)
 
-    def get_random_game_parameters(self):
+    def set_hit_enabled(self, enabled):
         """
-        Запускает новый раунд игры со случайными параметрами
-        :return: ширина, высота игрового поля в клетках, позиция шара в клетках
+        Разрешает или запрещает удар по шару вместе с кнопкой [Hit it!]
+        :param enabled: True или False
+        :return: None
         """
-        width_in_cells = random.randint(5, 10)
-        height_in_cells = random.randint(5, 10)
-        boll_position = (random.randint(1, width_in_cells - 1), random.randint(1, height_in_cells - 1))
-        return width_in_cells, height_in_cells, boll_position
+        super().set_hit_enabled(enabled)
+        if enabled:
+            self.hit_button.enable()
+        else:
+            self.hit_button.disable()
+
+    def board_changed(self):
+        """
+        Помечает статический слой игрового поля для перерисовки
+        :return: None
+        """
+        self.static_layer = None
+        if self.track_pointer:
+            self.set_hover(pygame.mouse.get_pos())
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Помечает все окно для перерисовки
+        :return: None
+        """
+        self.full_redraw = True
 
     def startup_game(self, width_in_cells, height_in_cells, boll_position):
         """
-        Запуск новой игры с новыми параметрами игрового поля
-        :param width_in_cells: ширина игрового поля в клеточках
-        :param height_in_cells: высота игрового поля в клеточках
-        :param boll_position: позиция шара
+        Новая игра: вид на поле возвращается к исходному (центр поля, без масштаба),
+        незаконченный расчет траектории отменяется
+        """
+        if self.jobs is not None:
+            self.jobs.cancel('hit_lines')
+        self.solving = False
+        self.view_x = self.view_y = 0
+        self.zoom = 1
+        super().startup_game(width_in_cells, height_in_cells, boll_position)
+
+    def calculate_hit_lines(self):
+        """
+        С планировщиком заданий траектория рассчитывается в пуле, а удар запрещен до получения результата.
+        Повторный выбор метки отменяет предыдущий расчет
+        :return: None
+        """
+        if self.jobs is None:
+            super().calculate_hit_lines()
+            return
+        self.jobs.submit('hit_lines', self.hit_lines_job(shot_cache=not self.jobs.processes))
+        self.solving = True
+        self.set_hit_enabled(False)
+
+    def poll_jobs(self):
+        """
+        Применяет готовые результаты расчетов (вызывается каждый кадр, не ждет расчетов).
+        Ошибка расчета в пуле не останавливает игру: она записывается в журнал,
+        а траектория рассчитывается заново в игровом цикле
+        :return: None
+        """
+        if self.jobs is None:
+            return
+        for result in self.jobs.poll():
+            if result.error:
+                logger.error('background job %r failed', result.key, exc_info=result.error)
+            if result.key == 'hit_lines':
+                self.solving = False
+                if result.error:
+                    super().calculate_hit_lines()
+                else:
+                    self.apply_hit_lines(*result.value)
+                self.set_hit_enabled(True)
+
+    def to_screen(self, x, y):
+        """
+        Переводит точку разметки поля в координаты окна
+        :return: (x, y) в окне
+        """
+        return (x - self.view_x) * self.zoom, (y - self.view_y) * self.zoom
+
+    def to_board(self, pos):
+        """
+        Переводит точку окна (указатель мыши) в координаты разметки поля
+        :param pos: позиция в окне
+        :return: (x, y) разметки поля
+        """
+        return pos[0] / self.zoom + self.view_x, pos[1] / self.zoom + self.view_y
+
+    def scaled(self, size):
+        """
+        Размер на экране с учетом масштаба (не меньше пикселя)
+        """
+        return size if self.zoom == 1 else max(1, round(size * self.zoom))
+
+    def set_view(self, view_x, view_y, zoom):
+        """
+        Устанавливает вид на поле. Масштаб ограничен zoom_min..zoom_max, сдвиг - так,
+        чтобы поле не уходило из окна дальше, чем на view_margin
+        :param view_x: точка разметки поля в левом верхнем углу окна, x
+        :param view_y: точка разметки поля в левом верхнем углу окна, y
+        :param zoom: масштаб
+        :return: None
+        """
+        zoom = min(max(zoom, self.zoom_min), self.zoom_max)
+        margin = self.border_line_thickness + self.view_margin
+        view_width = self.width / zoom
+        view_height = (self.height - self.hud_height) / zoom
+        low, high = sorted((self.board_x - margin, self.board_x + self.board_width + margin - view_width))
+        view_x = min(max(view_x, low), high)
+        low, high = sorted((self.board_y - margin, self.board_y + self.board_height + margin - view_height))
+        view_y = min(max(view_y, low), high)
+        if (view_x, view_y, zoom) != (self.view_x, self.view_y, self.zoom):
+            self.view_x, self.view_y, self.zoom = view_x, view_y, zoom
+            self.board_changed()
+
+    def scroll(self, dx, dy):
+        """
+        Сдвигает вид на (dx, dy) пикселей окна
+        :return: None
+        """
+        self.set_view(self.view_x + dx / self.zoom, self.view_y + dy / self.zoom, self.zoom)
+
+    def zoom_at(self, pos, factor):
+        """
+        Меняет масштаб в factor раз, оставляя на месте точку поля под pos
+        :param pos: позиция в окне
+        :param factor: множитель масштаба
+        :return: None
+        """
+        x, y = self.to_board(pos)
+        zoom = min(max(self.zoom * factor, self.zoom_min), self.zoom_max)
+        self.set_view(x - pos[0] / zoom, y - pos[1] / zoom, zoom)
+
+    def visible_cells(self, margin=0):
+        """
+        Столбцы и строки пересечений, попадающие в окно
+        :param margin: запас вокруг окна в пикселях разметки поля
+        :return: (range столбцов, range строк)
+        """
+        step = self.cell_size + self.inner_line_thickness
+        left = self.view_x - margin - self.board_x
+        top = self.view_y - margin - self.board_y
+        right = left + self.width / self.zoom + margin * 2
+        bottom = top + self.height / self.zoom + margin * 2
+        return (range(max(1, math.ceil(left / step)), min(self.width_in_cells - 1, math.floor(right / step)) + 1),
+                range(max(1, math.ceil(top / step)), min(self.height_in_cells - 1, math.floor(bottom / step)) + 1))
+
+    def marker_sprite(self, color, radius):
+        """
+        Заранее отрисованная метка для пакетного вывода через Surface.blits
+        :param color: цвет метки
+        :param radius: радиус на экране
+        :return: pygame.Surface размером 2 * radius + 1 с прозрачным фоном
+        """
+        key = (tuple(color), radius)
+        sprite = self.marker_sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1)).convert()
+            transparent = (255, 0, 255) if tuple(color)[:3] != (255, 0, 255) else (0, 0, 0)
+            sprite.fill(transparent)
+            sprite.set_colorkey(transparent)
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            sprite = self.marker_sprites[key] = sprite
+        return sprite
+
+    def set_free_aim(self, free_aim):
+        """
+        Включает или выключает свободное прицеливание (в любом направлении, с предпросмотром траектории)
+        :param free_aim: True или False
+        :return: None
+        """
+        self.free_aim = free_aim
+        self.preview_direction = None
+        self.board_changed()
+
+    def set_track_pointer(self, track_pointer):
+        """
+        Включает или выключает подсветку метки и предпросмотр траектории по указателю мыши
+        (при отрисовке без окна указатель стоит в (0, 0) и подсвечивал бы случайную метку)
+        :param track_pointer: True или False
+        :return: None
+        """
+        self.track_pointer = track_pointer
+        if not track_pointer:
+            self.hover_position = None
+            self.preview_direction = None
+            self.invalidate()
+
+    def free_direction(self, pos):
+        """
+        Направление удара от шара на точку окна в целых пикселях разметки поля
+        (не больше direction_limit по модулю, чтобы записываться в журнал ввода)
+        :param pos: позиция в окне
+        :return: (dx, dy)
+        """
+        x, y = self.to_board(pos)
+        dx = round(x - self.boll_coordinates.x)
+        dy = round(y - self.boll_coordinates.y)
+        scale = max(abs(dx), abs(dy)) / self.direction_limit
+        if scale > 1:
+            dx, dy = round(dx / scale), round(dy / scale)
+        return dx, dy
+
+    def set_preview(self, pos):
+        """
+        Направление предпросмотра траектории по указателю мыши. Сама траектория считается при отрисовке,
+        один раз на кадр, сколько бы событий движения мыши ни пришло
+        :param pos: позиция указателя мыши
+        :return: None
+        """
+        preview_direction = None
+        if (self.track_pointer and self.free_aim and not self.hit_it
+                and pos[1] < self.height - self.hud_height):
+            preview_direction = self.free_direction(pos)
+            if preview_direction == (0, 0):
+                preview_direction = None
+        if preview_direction != self.preview_direction:
+            self.preview_direction = preview_direction
+            self.invalidate()
+
+    def preview_points(self):
+        """
+        Точки траектории предпросмотра в окне (пересчитываются только при смене направления)
+        :return: список точек от шара до последнего касания борта
+        """
+        key = (self.preview_direction, self.boll_position, self.width_in_cells, self.height_in_cells)
+        if self.preview is None or self.preview[0] != key:
+            points, _ = self.free_trajectory(self.preview_direction, self.preview_bounces)
+            self.preview = key, [self.boll_coordinates] + [self.cell_to_point(point) for point in points]
+        return [self.to_screen(*point) for point in self.preview[1]]
+
+    def draw_preview(self):
+        """
+        Отображение предпросмотра траектории: отрезки бледнеют с каждым отскоком
         :return: None
         """
-        self.width_in_cells = width_in_cells
-        self.height_in_cells = height_in_cells
-        self.boll_position = boll_position
-        self.board_width = (self.cell_size * width_in_cells +
-                            self.inner_line_thickness * (width_in_cells - 1) )
-        self.board_height = (self.cell_size * height_in_cells +
-                             self.inner_line_thickness * (height_in_cells - 1))
-        self.board_x, self.board_y = ((self.width - self.board_width) // 2, (self.height - self.board_height) // 2)
-        self.board_corners = [Point((self.board_x, self.board_y)),  # left top
-                              Point((self.board_x + self.board_width, self.board_y)),  # right top
-                              Point((self.board_x, self.board_y + self.board_height)),  # left bottom
-                              Point((self.board_x + self.board_width, self.board_y + self.board_height))]  # rth bottom
-        self.board_sides = [((self.board_corners[0], self.board_corners[1]), (0, 1)),  # top
-                            ((self.board_corners[0], self.board_corners[2]), (1, 0)),  # left
-                            ((self.board_corners[1], self.board_corners[3]), (1, 0)),  # right
-                            ((self.board_corners[2], self.board_corners[3]), (0, 1))]  # bottom
-        self.intersections_coordinates = {}
-        for x in range(1, width_in_cells):
-            coordinate_x = self.board_x + x * (self.cell_size + self.inner_line_thickness)
-            for y in range(1, height_in_cells):
-                coordinate_y = self.board_y + y * (
-                        self.cell_size + self.inner_line_thickness)
-                self.intersections_coordinates[(x, y)] = Point((coordinate_x, coordinate_y))
-        self.boll_coordinates = self.intersections_coordinates[self.boll_position]
-        self.pocket_coordinates = ((self.board_x, self.board_y),
-                                   (self.board_x + self.board_width, self.board_y),
-                                   (self.board_x, self.board_y + self.board_height),
-                                   (self.board_x + self.board_width, self.board_y + self.board_height))
-        self.aim_coordinates = None
-        self.aim_position = None
-        self.intersect_points = []
-        self.ball_in_pocket = None
-        self.hit_it = None
-        self.hit_path_len = None
-        self.hit_button.enable()
-        self.game_stage = 'select_aim'
+        points = self.preview_points()
+        for i in range(len(points) - 1):
+            fade = 255 - 200 * i // len(points)
+            pygame.draw.line(self.surface, (fade, fade, fade), points[i], points[i + 1], self.preview_width)
+
+    def is_animating(self):
+        """
+        Возвращает True, пока идет анимация удара
+        :return: True или False
+        """
+        return self.game_stage == 'animation'
+
+    def trajectory_rect(self, start_len, end_len):
+        """
+        Область окна, которую занимают участки траектории, изменившиеся при росте пути от start_len до end_len.
+        Недорисованный отрезок растеризуется заново целиком, поэтому в область входит его начало
+        :param start_len: начальная длина пути
+        :param end_len: конечная длина пути
+        :return: pygame.Rect или None, если участок пуст
+        """
+        start_index, _ = self.path_point(start_len)
+        end_index, end_point = self.path_point(end_len)
+        if start_index == len(self.intersect_points):
+            return None
+        points = [self.intersect_points[start_index - 1] if start_index else self.boll_coordinates]
+        points += self.intersect_points[start_index:end_index]
+        points.append(end_point)
+        points = [self.to_screen(*point) for point in points]
+        left = min(x for x, _ in points)
+        top = min(y for _, y in points)
+        rect = pygame.Rect(left, top, max(x for x, _ in points) - left, max(y for _, y in points) - top)
+        margin = self.scaled(self.trajectory_margin) if self.zoom > 1 else self.trajectory_margin
+        return rect.inflate(margin * 2, margin * 2)
+
+    def dirty_rects(self):
+        """
+        Области окна, которые изменятся при следующей отрисовке кадра
+        :return: список pygame.Rect (пустой, если кадр не изменился)
+        """
+        win = self.game_stage == 'after_animation' and bool(self.ball_in_pocket)
+        if self.full_redraw or win != self.drawn_win:
+            return [self.surface.get_rect()]
+        rects = []
+        if self.hud_state() != self.hud_layer_state:
+            rects.append(pygame.Rect(0, self.height - self.hud_height, self.width, self.hud_height))
+        if self.hit_it and self.hit_path_len != self.drawn_path_len:
+            rect = self.trajectory_rect(self.drawn_path_len, self.hit_path_len)
+            if rect:
+                rects.append(rect)
+        if self.hover_position != self.drawn_hover_position:
+            for position in self.hover_position, self.drawn_hover_position:
+                if position:
+                    rects.append(self.hover_rect(position))
+        if self.overlay_enabled and self.overlay_surface is None:
+            rects.append(self.overlay_rect())
+        return rects
 
     def fill(self, color=color_black):
         """
@@ -184,7 +468,7 @@ class Game:
         """
         self.surface.fill(color)
 
-    def draw_dashed_line(self, color, start_pos: Point, end_pos: Point, width=1, dash_length=10):
+    def draw_dashed_line(self, color, start_pos: Point, end_pos: Point, width=1, dash_length=10, surface=None):
         """
         Отрисовка пунктирной линии
         :param color: цвет линии
@@ -192,18 +476,41 @@ class Game:
         :param end_pos: конечная позиция
         :param width: толщина линии
         :param dash_length: длина черты
+        :param surface: поверхность для отрисовки (по умолчанию окно игры)
         :return: None
         """
-        origin = Point(start_pos)
-        target = Point(end_pos)
-        displacement = target - origin
-        length = displacement.length()
-        slope = displacement / length
-
-        for index in range(0, length // dash_length, 2):
-            start = origin + (slope * index * dash_length)
-            end = origin + (slope * (index + 1) * dash_length)
-            pygame.draw.line(self.surface, color, start.get(), end.get(), width)
+        surface = surface or self.surface
+        x1, y1 = start_pos
+        x2, y2 = end_pos
+        # черты вне поверхности пропускаются: на большом поле линия может быть во много раз длиннее окна
+        visible = clip_segment_xy(x1, y1, x2, y2, -width, -width,
+                                  surface.get_width() + width, surface.get_height() + width)
+        if visible is None:
+            return
+        length = math.hypot(x2 - x1, y2 - y1)
+        for start, end in dashes_xy(x1, y1, x2, y2, dash_length, visible[0] * length, visible[1] * length):
+            pygame.draw.line(surface, color, start, end, width)
+
+    def draw_line(self, color, start_pos, end_pos, width=1):
+        """
+        Отрисовка отрезка, обрезанного по окну: толстую линию с концом за пределами окна
+        pygame.draw.line иногда продолжает за этот конец до края окна
+        :param color: цвет линии
+        :param start_pos: начальная позиция
+        :param end_pos: конечная позиция
+        :param width: толщина линии
+        :return: None
+        """
+        x1, y1 = start_pos
+        x2, y2 = end_pos
+        visible = clip_segment_xy(x1, y1, x2, y2, 0, 0, self.surface.get_width() - 1, self.surface.get_height() - 1)
+        if visible is None:
+            return
+        t0, t1 = visible
+        pygame.draw.line(self.surface, color,
+                         (x1 + (x2 - x1) * t0, y1 + (y2 - y1) * t0),
+                         (x1 + (x2 - x1) * t1, y1 + (y2 - y1) * t1),
+                         width)
 
     def draw_hit_lines(self):
         """
@@ -211,256 +518,482 @@ class Game:
         :return: None
         """
         if self.hit_it:
+            index, point = self.path_point(self.hit_path_len)
             prev_point = self.boll_coordinates
-            hit_path_len = self.hit_path_len
-            draw_full_lines = []
-            for i, intersect_point in enumerate(self.intersect_points):
-                line_len = Vector((prev_point, intersect_point)).length()
-                if line_len <= hit_path_len:
-                    # рисуем целиком
-                    pygame.draw.line(surface=self.surface,
-                                     color=pygame.Color(i * 50, i * 50, 255 - i * 50),
-                                     start_pos=prev_point,
-                                     end_pos=intersect_point,
-                                     width=3)
-                    hit_path_len -= line_len
-                    draw_full_lines.append(True)
-                else:
-                    # рисуем часть линии
-                    start_pos, end_pos = make_vector(prev_point, intersect_point, hit_path_len)
-                    pygame.draw.line(surface=self.surface,
-                                     color=pygame.Color(i * 50, i * 50, 255 - i * 50),
-                                     start_pos=start_pos,
-                                     end_pos=end_pos,
-                                     width=3)
-                    draw_full_lines.append(False)
-                    break
+            for i, intersect_point in enumerate(self.intersect_points[:index + 1]):
+                # последний отрезок рисуем до текущего положения шара
+                self.draw_line(color=pygame.Color(i * 50, i * 50, 255 - i * 50),
+                               start_pos=self.to_screen(*prev_point),
+                               end_pos=self.to_screen(*(intersect_point if i < index else point)),
+                               width=self.scaled(3))
                 prev_point = intersect_point
 
-            if all(draw_full_lines):
-                if self.game_stage == 'animation':
-                    if self.ball_in_pocket:
-                        self.scores += 5
-                    else:
-                        self.scores -= 1
-                self.game_stage = 'after_animation'
-
-            self.hit_path_len = (self.hit_path_len + 10) % 100000
-
-    def draw_board(self):
+    def draw_ball(self, surface=None):
         """
-        Отрисовка игрового поля
+        Отображение шара
+        :param surface: поверхность для отрисовки (по умолчанию окно игры)
         :return: None
         """
-        # рисуем вертикальные линии
-        for x in range(1, self.width_in_cells):
-            coordinate_x = self.intersections_coordinates[(x, 1)].x
-            pygame.draw.line(self.surface,
-                             color=color_green,
-                             start_pos=(coordinate_x, self.board_y),
-                             end_pos=(coordinate_x, self.board_y + self.board_height)
-                             )
-
-        # рисуем горизонтальные линии
-        for y in range(1, self.height_in_cells):
-            coordinate_y = self.intersections_coordinates[(1, y)].y
-            pygame.draw.line(surface=self.surface,
-                             color=color_green,
-                             width=self.inner_line_thickness,
-                             start_pos=(self.board_x, coordinate_y),
-                             end_pos=(self.board_x + self.board_width, coordinate_y)
-                             )
+        pygame.draw.circle(surface=surface or self.surface,
+                           color=color_white,
+                           radius=self.scaled(self.ball_radius),
+                           center=self.to_screen(*self.boll_coordinates))
+
+    def build_static_layer(self, surface=None, titles=True):
+        """
+        Отрисовка статического слоя: поле, лузы, метки пересечений, линия прицеливания и заголовки.
+        Рисуются только видимые в окне столбцы и строки поля, метки выводятся одним Surface.blits.
+        Слой меняется только при новом раунде, выборе метки, ударе и изменении вида на поле
+        :param surface: поверхность размера окна для отрисовки (по умолчанию - новая)
+        :param titles: выводить заголовок и подсказки (превью полей рисуются без них)
+        :return: pygame.Surface
+        """
+        if surface is None:
+            surface = pygame.Surface((self.width, self.height)).convert()
+        surface.fill(self.background_color)
+        self.profiler.mark('static.surface')
+
+        step = self.cell_size + self.inner_line_thickness
+        columns, rows = self.visible_cells(self.intersections_radius + self.hover_width)
+        left, top = self.to_screen(self.board_x, self.board_y)
+        right, bottom = self.to_screen(self.board_x + self.board_width, self.board_y + self.board_height)
+        # линии сетки обрезаются по окну (с запасом в пиксель)
+        line_top, line_bottom = max(top, -1), min(bottom, self.height + 1)
+        line_left, line_right = max(left, -1), min(right, self.width + 1)
+        if step * self.zoom >= self.grid_min_step:
+            # рисуем вертикальные линии
+            for x in columns:
+                coordinate_x, _ = self.to_screen(self.board_x + x * step, 0)
+                pygame.draw.line(surface,
+                                 color=color_green,
+                                 start_pos=(coordinate_x, line_top),
+                                 end_pos=(coordinate_x, line_bottom)
+                                 )
+
+            # рисуем горизонтальные линии
+            for y in rows:
+                _, coordinate_y = self.to_screen(0, self.board_y + y * step)
+                pygame.draw.line(surface=surface,
+                                 color=color_green,
+                                 width=self.scaled(self.inner_line_thickness),
+                                 start_pos=(line_left, coordinate_y),
+                                 end_pos=(line_right, coordinate_y)
+                                 )
+        self.profiler.mark('static.grid')
 
         # рисуем границы бильярдного стола
-        pygame.draw.rect(surface=self.surface,
+        border = self.scaled(self.border_line_thickness)
+        pygame.draw.rect(surface=surface,
                          color=color_green,
-                         width=self.border_line_thickness,
-                         rect=(self.board_x - self.border_line_thickness,
-                               self.board_y - self.border_line_thickness,
-                               self.board_width + self.border_line_thickness * 2,
-                               self.board_height + self.border_line_thickness * 2)
+                         width=border,
+                         rect=(left - border, top - border, right - left + border * 2, bottom - top + border * 2)
                          )
 
         # рисуем лузы
         for coordinates in self.pocket_coordinates:
-            pygame.draw.circle(surface=self.surface,
+            pygame.draw.circle(surface=surface,
                                color=color_green,
-                               radius=self.pocket_radius,
-                               center=coordinates)
+                               radius=self.scaled(self.pocket_radius),
+                               center=self.to_screen(*coordinates))
+        self.profiler.mark('static.border_pockets')
 
         # рисуем точку прицеливания и линию от шара до точки прицеливания
         if not self.hit_it:
-            if self.aim_position:
+            if self.aim_coordinates:
                 # рисуем линию от шара до точки прицеливания (если она определена)
                 self.draw_dashed_line(color=color_white,
-                                      start_pos=self.boll_coordinates,
-                                      end_pos=self.aim_coordinates,
-                                      width=4)
+                                      start_pos=self.to_screen(*self.boll_coordinates),
+                                      end_pos=self.to_screen(*self.aim_coordinates),
+                                      width=self.scaled(4),
+                                      surface=surface)
                 # рисуем точку прицеливания (если она определена)
-                pygame.draw.circle(surface=self.surface,
+                pygame.draw.circle(surface=surface,
                                    color=self.target_color,
-                                   radius=self.intersections_radius,
-                                   center=self.aim_coordinates)
+                                   radius=self.scaled(self.intersections_radius),
+                                   center=self.to_screen(*self.aim_coordinates))
+        self.profiler.mark('static.aim')
 
         # рисуем кружки на месте пересечения линий (возможные цели для нанесения удара)
-        for coordinates in self.intersections_coordinates.values():
-            pygame.draw.circle(surface=self.surface,
-                               color=self.intersection_color,
-                               radius=self.intersections_radius,
-                               center=coordinates)
+        radius = self.scaled(self.intersections_radius)
+        if radius >= self.marker_min_radius:
+            sprite = self.marker_sprite(self.intersection_color, radius)
+            screen_x = [round(self.to_screen(self.board_x + x * step, 0)[0]) - radius for x in columns]
+            screen_y = [round(self.to_screen(0, self.board_y + y * step)[1]) - radius for y in rows]
+            surface.blits([(sprite, (x, y)) for x in screen_x for y in screen_y], doreturn=False)
+        self.profiler.mark('static.intersections')
 
-        # рисуем траекторию удара по шару
-        self.draw_hit_lines()
+        if not titles:
+            return surface
 
-        # рисуем шар
-        pygame.draw.circle(surface=self.surface,
-                           color=color_white,
-                           radius=self.ball_radius,
-                           center=self.boll_coordinates)
+        # выводим текст
+        text = text_cache.render('Yandex billiard game', self.font, 40, color_lighter_green)
+        surface.blit(text, ((self.width // 2 - text.get_width() // 2), 10))
+        text = text_cache.render('Select an aiming point and press [Hit it!] button', self.font, 30, color_dark_green)
+        surface.blit(text, ((self.width // 2 - text.get_width() // 2), 50))
+        text = text_cache.render('Press [Next] button for the next round', self.font, 30, color_dark_green)
+        surface.blit(text, ((self.width // 2 - text.get_width() // 2), 75))
+        self.profiler.mark('static.text')
+        return surface
+
+    def deferred_startup(self):
+        """
+        Подготовка, которая не нужна для первого кадра: надписи, появляющиеся позже,
+        и шрифт оверлея профилировщика. Вызывается после вывода первого кадра
+        :return: None
+        """
+        text_cache.render('Win!', self.font, 200, color_red)
+        text_cache.render("It's fate, dude!", self.font, 20, color_red)
+        text_cache.render('Solving...', self.font, 20, color_light_gray)
+        for button in self.hit_button, self.new_button:
+            for color in color_lighter_green, color_light_gray:
+                text_cache.render(button.text, button.font, 40, color)
+        text_cache.font('monospace', self.overlay_font_size)
+
+    def hud_state(self):
+        """
+        Все, от чего зависит слой интерфейса
+        :return: кортеж
+        """
+        return (self.scores, self.hit_button.enabled, self.new_button.enabled,
+                self.game_stage == 'after_animation' and not self.ball_in_pocket, self.solving)
 
-        # рисуем элементы управления
-        self.hit_button.draw(surface=self.surface)
-        self.new_button.draw(surface=self.surface)
+    def build_hud_layer(self):
+        """
+        Отрисовка слоя интерфейса внизу окна: кнопки, набранные очки, надпись о промахе
+        и надпись на время расчета траектории
+        :return: pygame.Surface
+        """
+        surface = pygame.Surface((self.width, self.hud_height)).convert()
+        surface.fill(self.background_color)
 
-        # выводим текст
-        font = pygame.font.SysFont(self.font, 40)
-        text = font.render('Yandex billiard game', 1, color_lighter_green)
-        self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), 10))
-        font = pygame.font.SysFont(self.font, 30)
-        text = font.render('Select an aiming point and press [Hit it!] button', 1, color_dark_green)
-        self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), 50))
-        text = font.render('Press [Next] button for the next round', 1, color_dark_green)
-        self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), 75))
+        # рисуем элементы управления
+        self.hit_button.draw(surface=surface, offset=(0, self.height - self.hud_height))
+        self.new_button.draw(surface=surface, offset=(0, self.height - self.hud_height))
 
         # выводим количество набранных очков
-        font = pygame.font.SysFont(self.font, 20)
-        text = font.render('Yours scores', 1, color_dark_green)
-        self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.height - 30))
-        font = pygame.font.SysFont(self.font, 80)
-        text = font.render(str(self.scores), 1, color_red)
-        self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.height - 80))
-
-        # выводим надпись win или fate
-        if self.game_stage == 'after_animation':
-            if self.ball_in_pocket:
-                font = pygame.font.SysFont(self.font, 200)
-                text = font.render('Win!', 1, color_red)
-                self.surface.blit(text, ((self.width // 2 - text.get_width() // 2),
-                                         (self.height // 2 - text.get_height() // 2)))
-            else:
-                font = pygame.font.SysFont(self.font, 20)
-                text = font.render("It's fate, dude!", 1, color_red)
-                self.surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.height - 100))
-
-    def hit_intersection(self, pos):
-        """
-        Возвращает True в случае, если указатель мыши на пересечении
-        :param pos: позиция указателя мыши
-        :return: возвращает True в случае, если указатель мыши на пересечении или False
+        text = text_cache.render('Yours scores', self.font, 20, color_dark_green)
+        surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.hud_height - 30))
+        text = text_cache.render(str(self.scores), self.font, 80, color_red)
+        surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.hud_height - 80))
+
+        # выводим надпись fate
+        if self.game_stage == 'after_animation' and not self.ball_in_pocket:
+            text = text_cache.render("It's fate, dude!", self.font, 20, color_red)
+            surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.hud_height - 100))
+        elif self.solving:
+            text = text_cache.render('Solving...', self.font, 20, color_light_gray)
+            surface.blit(text, ((self.width // 2 - text.get_width() // 2), self.hud_height - 100))
+        return surface
+
+    def draw_board(self, area=None):
+        """
+        Отрисовка кадра из слоев: статический слой поля, траектория и шар, слой интерфейса
+        :param area: область окна, которую нужно перерисовать (из dirty_rects), None - все окно.
+            Статический слой и надписи поверх кадра копируются только в ней, а траектория, шар
+            и непрозрачный слой интерфейса (он закрывает уходящую под него траекторию) рисуются целиком:
+            вне области они совпадают с уже нарисованными, а обрезка по области сдвигала бы пиксели линий
+        :return: None
         """
-        return self.surface.get_at(pos) == self.intersection_color
+        if self.static_layer is None:
+            self.static_layer = self.build_static_layer()
+        self.surface.set_clip(area)
+        self.surface.blit(self.static_layer, (0, 0))
+        self.surface.set_clip(None)
+        self.profiler.mark('draw.static')
+
+        # подсвечиваем метку под указателем мыши
+        if self.hover_position:
+            pygame.draw.circle(surface=self.surface,
+                               color=self.hover_color,
+                               radius=self.scaled(self.intersections_radius + self.hover_width),
+                               center=self.to_screen(*self.intersections_coordinates[self.hover_position]),
+                               width=self.scaled(self.hover_width))
+        self.profiler.mark('draw.hover')
+
+        # рисуем предпросмотр траектории при свободном прицеливании
+        if self.preview_direction and not self.hit_it:
+            self.draw_preview()
+        self.profiler.mark('draw.preview')
 
-    def set_aim(self, pos):
+        # рисуем траекторию удара по шару
+        self.draw_hit_lines()
+        self.profiler.mark('draw.hit_lines')
+
+        self.draw_ball()
+        self.profiler.mark('draw.ball')
+
+        hud_state = self.hud_state()
+        if hud_state != self.hud_layer_state:
+            self.hud_layer = self.build_hud_layer()
+            self.hud_layer_state = hud_state
+        self.surface.blit(self.hud_layer, (0, self.height - self.hud_height))
+        self.profiler.mark('draw.hud')
+
+        self.full_redraw = False
+        self.drawn_path_len = self.hit_path_len
+        self.drawn_hover_position = self.hover_position
+        self.drawn_win = self.game_stage == 'after_animation' and bool(self.ball_in_pocket)
+
+        self.surface.set_clip(area)
+        # выводим надпись win
+        if self.drawn_win:
+            text = text_cache.render('Win!', self.font, 200, color_red)
+            self.surface.blit(text, ((self.width // 2 - text.get_width() // 2),
+                                     (self.height // 2 - text.get_height() // 2)))
+        self.profiler.mark('draw.win')
+
+        if self.overlay_enabled:
+            self.draw_overlay()
+            self.profiler.mark('draw.overlay')
+        self.surface.set_clip(None)
+
+    def set_hover(self, pos):
         """
-        Выбирает одно из пересечений как метку для прицеливания
-        :param pos:
-        :return:
+        Подсвечивает метку пересечения под указателем мыши
+        :param pos: позиция указателя мыши
+        :return: None
         """
-        for position, coordinates in self.intersections_coordinates.items():
-            if (abs(pos[0] - coordinates.x) <= self.intersections_radius and
-                    abs(pos[1] - coordinates.y) <= self.intersections_radius):
-                self.aim_coordinates = coordinates
-                self.aim_position = position
-                self.hit_it = False
-                self.hit_button.enable()
-                self.game_stage = 'select_aim'
-                return coordinates
+        self.set_preview(pos)
+        pos = self.to_board(pos)
+        self.hover_position = None
+        if self.track_pointer and not self.free_aim and self.hit_intersection(pos):
+            self.hover_position = self.locate_intersection(pos)
 
-    def check_near_corner(self, point):
+    def hover_rect(self, position):
         """
-        Проверяет, не находится ли шар рядом с лузой
-        :param point:
-        :return:
+        Область окна, которую занимает подсветка метки
+        :param position: позиция пересечения в клетках
+        :return: pygame.Rect
         """
-        delta = 2
-        for corner in self.board_corners:
-            if abs(corner.x - point.x) <= delta and abs(corner.y - point.y) <= delta:
-                return corner
+        x, y = self.to_screen(*self.intersections_coordinates[position])
+        radius = self.scaled(self.intersections_radius + self.hover_width)
+        return pygame.Rect(x - radius, y - radius, radius * 2 + 1, radius * 2 + 1)
 
-    def calculate_hit_lines(self):
+    def toggle_overlay(self):
         """
-        Расчет траектории движения шара после удара в заданном направлении
+        Показывает или скрывает оверлей профилировщика (при показе включает сбор замеров)
         :return: None
         """
-        vector_len = 10000000
-
-        self.intersect_points = []
-        self.ball_in_pocket = False
-
-        start_point = self.boll_coordinates
-        end_point = self.aim_coordinates
-        point1, end_point = make_vector(start_point, end_point, vector_len)
-
-        start_side = None
-        for i in range(5):
-            vector = make_vector(start_point, end_point, vector_len)
-            key = None
-            intersect_point = None
-            for side, key in self.board_sides:
-                if side != start_side:
-                    intersect_point = intersect(side, vector)
-                    if intersect_point:
-                        start_side = side
-                        self.intersect_points.append(intersect_point)
-                        self.ball_in_pocket = self.check_near_corner(intersect_point)
-                        break
-            if self.ball_in_pocket:
-                break
-            if intersect_point:
-                d_x = intersect_point.x - end_point.x
-                d_y = intersect_point.y - end_point.y
-                start_point = intersect_point
-                end_point = Point((end_point.x + key[0] * d_x * 2, end_point.y + key[1] * d_y * 2))
+        self.overlay_enabled = not self.overlay_enabled
+        if self.overlay_enabled and not self.profiler.enabled:
+            self.profiler.enable()
+        self.overlay_time = -math.inf
+        self.overlay_lines = []
+        self.overlay_surface = None
+        self.invalidate()
+
+    def refresh_overlay(self):
+        """
+        Пересчитывает статистику оверлея не чаще, чем раз в overlay_interval секунд
+        :return: None
+        """
+        if not self.overlay_enabled:
+            return
+        now = time.perf_counter()
+        if now - self.overlay_time < self.overlay_interval:
+            return
+        self.overlay_time = now
+        lines = ['phase, ms                mean     p50     p95     p99']
+        for phase, stats in self.profiler.summary().items():
+            lines.append(f'{phase:22s} {stats["mean"]:7.3f} {stats["p50"]:7.3f} '
+                         f'{stats["p95"]:7.3f} {stats["p99"]:7.3f}')
+        if len(lines) != len(self.overlay_lines):
+            # размер оверлея изменился - перерисовываем окно целиком
+            self.invalidate()
+        self.overlay_lines = lines
+        self.overlay_surface = None
+
+    def overlay_rect(self):
+        """
+        Область окна, которую занимает оверлей профилировщика
+        :return: pygame.Rect
+        """
+        return pygame.Rect(0, 0, self.overlay_width, self.overlay_line_height * len(self.overlay_lines) + 4)
 
-    def hit(self):
+    def draw_overlay(self):
         """
-        Запускает удар по шару в заданном направлении
+        Отрисовка оверлея профилировщика поверх кадра
         :return: None
         """
-        if self.aim_position:
-            self.hit_it = True
-            self.hit_path_len = 0
-            self.hit_button.disable()
-            self.game_stage = 'animation'
+        if self.overlay_surface is None:
+            rect = self.overlay_rect()
+            surface = pygame.Surface(rect.size, pygame.SRCALPHA)
+            surface.fill(self.overlay_background)
+            font = text_cache.font('monospace', self.overlay_font_size)
+            for i, line in enumerate(self.overlay_lines):
+                surface.blit(font.render(line, 1, self.overlay_color), (4, 2 + i * self.overlay_line_height))
+            self.overlay_surface = surface
+        self.surface.blit(self.overlay_surface, (0, 0))
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dirty', action='store_true',
+                        help='обновлять только изменившиеся области окна и ждать событий, пока нет анимации')
+    parser.add_argument('--profile', action='store_true',
+                        help='профилировать фазы кадра с запуска (F3 - оверлей, F4 - выгрузка замеров)')
+    parser.add_argument('--profile-dump', metavar='PATH',
+                        help='при выходе сохранить замеры профилировщика в PATH (.csv или .json)')
+    parser.add_argument('--puzzles', default='puzzles.bin', metavar='PATH',
+                        help='индекс решаемых раундов (строится командой python puzzle_index.py)')
+    parser.add_argument('--difficulty', choices=DIFFICULTIES,
+                        help='сложность раундов из индекса (по умолчанию - любая)')
+    parser.add_argument('--seed', type=int, help='зерно генератора случайных раундов')
+    parser.add_argument('--record', metavar='PATH',
+                        help='записать ввод в журнал для воспроизведения (python replay.py PATH); '
+                             'анимация идет с постоянным шагом на кадр')
+    parser.add_argument('--min-cells', type=int, default=BilliardModel.min_cells,
+                        help='наименьший размер случайного поля в клетках')
+    parser.add_argument('--max-cells', type=int, default=BilliardModel.max_cells,
+                        help='наибольший размер случайного поля в клетках (до тысяч клеток: поле прокручивается '
+                             'стрелками и правой кнопкой мыши, масштаб - колесом мыши и +/-)')
+    parser.add_argument('--free-aim', action='store_true',
+                        help='свободное прицеливание в любом направлении (переключается клавишей F)')
+    parser.add_argument('--solver-workers', type=int, default=1,
+                        help='число потоков для расчета траекторий вне игрового цикла (0 - в игровом цикле)')
+    parser.add_argument('--solver-processes', action='store_true',
+                        help='считать траектории в пуле процессов вместо потоков (без кэша траекторий)')
+    parser.add_argument('--startup-time', action='store_true',
+                        help='измерить время запуска до первого кадра и выйти')
+    args = parser.parse_args()
+    if args.record and args.seed is not None and args.seed not in SEED_RANGE:
+        parser.error('--seed must fit in a signed 64-bit integer to be recorded')
+    startup = [('imports', time.perf_counter())]
+
+    Game.min_cells = args.min_cells
+    Game.max_cells = args.max_cells
+    if os.path.exists(args.puzzles):
+        Game.puzzle_index = PuzzleIndex(args.puzzles)
+        Game.difficulty = args.difficulty
     width = height = 800
-    game = Game(width, height, 'Just a simple game')
+    seed = args.seed
+    if seed is None and args.record:
+        seed = random.randrange(2 ** 63)
+    game = Game(width, height, 'Just a simple game', seed=seed)
+    recorder = InputRecorder(args.record, game) if args.record else None
+    if args.free_aim:
+        game.set_free_aim(True)
+    # готовый результат расчета будит игровой цикл, ожидающий событий
+    job_done = pygame.event.custom_type()
+    if args.solver_workers:
+        game.jobs = JobScheduler(args.solver_workers, processes=args.solver_processes,
+                                 notify=lambda: pygame.event.post(pygame.event.Event(job_done)))
+    startup.append(('game init', time.perf_counter()))
+    profiler = game.profiler
+    profiler.enable(args.profile or bool(args.profile_dump))
     clock = pygame.time.Clock()
     fps = 60
 
     running = True
+    dt = 0
+    frame = 0
     while running:
-        # отрисовка и изменение свойств объектов
-        game.fill()
-        game.draw_board()
+        profiler.start_frame()
+        # изменение свойств объектов и отрисовка
+        stage = game.game_stage
+        game.poll_jobs()
+        game.update(dt)
+        if recorder and game.game_stage != stage:
+            recorder.check(frame, game)
+        game.refresh_overlay()
+        profiler.mark('update')
+        if args.dirty:
+            rects = game.dirty_rects()
+            if rects:
+                game.draw_board(rects[0].unionall(rects[1:]))  # перерисовываем только изменившуюся область
+                pygame.display.update(rects)  # смена изменившихся областей кадра
+                profiler.mark('display')
+        else:
+            game.draw_board()
+            pygame.display.flip()  # смена кадра
+            profiler.mark('display')
+        if frame == 0:
+            # первый кадр выведен - доделываем то, что ему не требовалось
+            startup.append(('first frame', time.perf_counter()))
+            game.deferred_startup()
+            startup.append(('deferred work', time.perf_counter()))
+            if args.startup_time:
+                previous = startup_clock.START_TIME
+                for stage, moment in startup:
+                    print(f'{stage:15s} {(moment - previous) * 1000:8.1f} ms   '
+                          f'(total {(moment - startup_clock.START_TIME) * 1000:8.1f} ms)')
+                    previous = moment
+                break
 
         # цикл приема и обработки сообщений
-        for event in pygame.event.get():
+        events = pygame.event.get()
+        if args.dirty and not events and not game.is_animating():
+            # ничего не меняется - ждем следующего события
+            events = [pygame.event.wait()]
+        profiler.mark('events.wait')
+        for event in events:
             # при закрытии окна
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if game.hit_intersection(event.pos):
-                    game.set_aim(event.pos)
-                    game.calculate_hit_lines()
-                if game.hit_button.mouse_is_over(event.pos):
-                    game.hit()
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                game.invalidate()
+            if event.type == pygame.MOUSEMOTION:
+                if event.buttons[2]:
+                    # перетаскивание поля правой кнопкой мыши
+                    game.scroll(-event.rel[0], -event.rel[1])
+                game.set_hover(event.pos)
+            if event.type == pygame.MOUSEWHEEL:
+                game.zoom_at(pygame.mouse.get_pos(), game.zoom_step ** event.y)
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == pygame.BUTTON_LEFT:
+                pos = game.to_board(event.pos)
+                if game.free_aim and event.pos[1] < height - game.hud_height:
+                    aim_direction = game.free_direction(event.pos)
+                    game.select_direction(aim_direction)
+                    if recorder:
+                        recorder.record(frame, AIM_DIRECTION, *aim_direction)
+                elif event.pos[1] < height - game.hud_height and game.hit_intersection(pos):
+                    position = game.locate_intersection(pos)
+                    game.select_aim(position)
+                    if recorder:
+                        recorder.record(frame, AIM, *position)
+                # нажатие на запрещенную кнопку (траектория еще рассчитывается) не записывается
+                if game.hit_button.mouse_is_over(event.pos) and game.hit_enabled:
+                    game.press_hit()
+                    if recorder:
+                        recorder.record(frame, HIT)
                 if game.new_button.mouse_is_over(event.pos):
-                    game.startup_game(*game.get_random_game_parameters())
-        pygame.display.flip()  # смена кадра
+                    game.press_next()
+                    if recorder:
+                        recorder.record(frame, NEXT)
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN):
+                    step_x = width * game.scroll_step
+                    step_y = height * game.scroll_step
+                    game.scroll({pygame.K_LEFT: -step_x, pygame.K_RIGHT: step_x}.get(event.key, 0),
+                                {pygame.K_UP: -step_y, pygame.K_DOWN: step_y}.get(event.key, 0))
+                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    game.zoom_at((width // 2, (height - game.hud_height) // 2), game.zoom_step)
+                if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    game.zoom_at((width // 2, (height - game.hud_height) // 2), 1 / game.zoom_step)
+                if event.key == pygame.K_f:
+                    game.set_free_aim(not game.free_aim)
+                if event.key == pygame.K_HOME:
+                    game.set_view(0, 0, 1)
+                if event.key == pygame.K_F3:
+                    game.toggle_overlay()
+                if event.key == pygame.K_F4 and profiler.enabled:
+                    stamp = time.strftime('%Y%m%d-%H%M%S')
+                    profiler.dump(f'profile-{stamp}.csv')
+                    profiler.dump(f'profile-{stamp}.json')
+        profiler.mark('events')
         # временная задержка
-        clock.tick(fps)
-
+        dt = clock.tick(fps) / 1000
+        if recorder:
+            # при записи время игры определяется номером кадра
+            dt = game.frame_time
+        frame += 1
+        profiler.mark('tick')
+
+    if game.jobs:
+        game.jobs.shutdown()
+    if recorder:
+        recorder.check(frame - 1, game)
+        recorder.close()
+    if args.profile_dump:
+        profiler.dump(args.profile_dump)
     pygame.quit()
@@ -0,0 +1,546 @@
+import math
+import random
+from bisect import bisect_right
+from collections.abc import Mapping
+from functools import partial
+from itertools import islice
+from typing import NamedTuple
+
+from geometry import Point, Vector
+from raycast import cast
+from shot_cache import ShotCache
+from solver import solve, direction
+
+
+def is_pocketed(shot, max_bounces):
+    """
+    Засчитывается ли попадание в лузу: луза должна встретиться среди первых max_bounces касаний бортов
+    :param shot: решение удара solver.Shot
+    :param max_bounces: максимальное число касаний бортов (включая попадание в лузу)
+    :return: True или False
+    """
+    return shot.pocket is not None and shot.bounces < max_bounces
+
+
+def hit_lines(width_in_cells, height_in_cells, ball, aim_position, aim_direction, max_bounces, pocket_size,
+              shot_cache=None):
+    """
+    Траектория удара в клетках без обращения к состоянию игры
+    :param width_in_cells: ширина игрового поля в клетках
+    :param height_in_cells: высота игрового поля в клетках
+    :param ball: позиция шара в клетках
+    :param aim_position: позиция метки прицеливания (удар по пересечению) или None
+    :param aim_direction: направление свободного удара или None
+    :param max_bounces: максимальное число касаний бортов (включая попадание в лузу)
+    :param pocket_size: размер лузы в клетках при свободном прицеливании
+    :param shot_cache: кэш траекторий ShotCache (None - считать удар заново)
+    :return: (итератор точек касания бортов в клетках, индекс лузы или None)
+    """
+    rect = (0, 0, width_in_cells, height_in_cells)
+    if aim_direction is not None:
+        points = []
+        pocket = None
+        for bounce in islice(cast(ball, aim_direction, rect, pocket_size), max_bounces):
+            points.append(bounce.point)
+            pocket = bounce.pocket
+        return iter(points), pocket
+
+    if shot_cache is not None:
+        shot, points = shot_cache.get(width_in_cells, height_in_cells, ball, aim_position, max_bounces)
+    else:
+        shot = solve(width_in_cells, height_in_cells, ball, aim_position)
+        # точки касания бортов вычисляются лениво по ходу анимации
+        points = (bounce.point for bounce in cast(ball, direction(ball, aim_position), rect))
+    if is_pocketed(shot, max_bounces):
+        return islice(points, shot.bounces + 1), shot.pocket
+    return islice(points, max_bounces), None
+
+
+def solved_hit_lines(*args):
+    """
+    То же, что hit_lines, но все точки траектории вычисляются сразу (для расчета вне игрового цикла)
+    :return: (кортеж точек касания бортов в клетках, индекс лузы или None)
+    """
+    points, pocket = hit_lines(*args)
+    return tuple(points), pocket
+
+
+class IntersectionGrid(Mapping):
+    """
+    Экранные координаты пересечений поля: позиция (x, y) в клетках -> Point.
+    Координаты вычисляются при обращении, поэтому память не зависит от размера поля.
+    Обход - по столбцам (x, затем y)
+    """
+    __slots__ = ('board_x', 'board_y', 'step', 'width_in_cells', 'height_in_cells')
+
+    def __init__(self, board_x, board_y, step, width_in_cells, height_in_cells):
+        self.board_x = board_x
+        self.board_y = board_y
+        self.step = step
+        self.width_in_cells = width_in_cells
+        self.height_in_cells = height_in_cells
+
+    def __getitem__(self, position):
+        x, y = position
+        if not (0 < x < self.width_in_cells and 0 < y < self.height_in_cells):
+            raise KeyError(position)
+        return Point.from_xy(self.board_x + x * self.step, self.board_y + y * self.step)
+
+    def __contains__(self, position):
+        x, y = position
+        return 0 < x < self.width_in_cells and 0 < y < self.height_in_cells
+
+    def __iter__(self):
+        for x in range(1, self.width_in_cells):
+            for y in range(1, self.height_in_cells):
+                yield x, y
+
+    def __len__(self):
+        return (self.width_in_cells - 1) * (self.height_in_cells - 1)
+
+
+class BilliardModel:
+    """
+    Состояние и правила игры без отрисовки: разметка поля, шар, прицел, траектория, очки и стадии игры.
+    Стадии: 'select_aim' -> 'animation' -> 'after_animation'
+    """
+    cell_size = 50
+
+    inner_line_thickness = 1
+    border_line_thickness = 5
+    pocket_radius = 20
+    ball_radius = 18
+    intersections_radius = 10
+    # максимальное число касаний бортов (включая попадание в лузу)
+    max_bounces = 5
+    # скорость анимации удара (пикселей в секунду)
+    hit_speed = 600
+    # длительность кадра по умолчанию и наибольший шаг анимации за кадр (секунды)
+    frame_time = 1 / 60
+    max_frame_time = 0.1
+
+    pocket_scores = 5
+    miss_scores = -1
+
+    # диапазон размеров случайного поля в клетках
+    min_cells = 5
+    max_cells = 10
+
+    # число касаний бортов в предпросмотре траектории при свободном прицеливании
+    preview_bounces = 30
+
+    # общий для всех партий кэш траекторий (None - считать каждый удар заново)
+    shot_cache = ShotCache()
+    # индекс решаемых раундов puzzle_index.PuzzleIndex (None - поля выбираются вслепую) и уровень сложности
+    puzzle_index = None
+    difficulty = None
+
+    def __init__(self, width, height, seed=None):
+        self.seed = seed
+        # свой генератор случайных чисел у каждой игры: партия воспроизводится по зерну
+        self.rng = random.Random(seed)
+        self.game_stage = 'select_aim'
+        self.scores = 0
+        self.hit_it = None
+        self.hit_enabled = None
+        self.ball_in_pocket = None
+        self.intersect_points = []
+        self.hit_lines_len = None
+        self.hit_lines_table = []
+        self.hit_path = None
+        self.hit_path_done = None
+        self.board_corners = None
+        self.aim_position = None
+        self.aim_direction = None
+        self.aim_coordinates = None
+        self.boll_coordinates = None
+        self.boll_position = None
+        self.hit_path_len = None
+        self.pocket_coordinates = None
+        self.height_in_cells = None
+        self.width_in_cells = None
+        self.intersections_coordinates = {}
+        self.board_y = None
+        self.board_x = None
+        self.board_height = None
+        self.board_width = None
+        self.width = width
+        self.height = height
+
+        self.startup_game(*self.get_random_game_parameters())
+
+    def get_random_game_parameters(self):
+        """
+        Запускает новый раунд игры со случайными параметрами.
+        Если подключен индекс решаемых раундов (для тех же правил), раунд берется из него
+        :return: ширина, высота игрового поля в клетках, позиция шара в клетках
+        """
+        index = self.puzzle_index
+        if (index is not None and index.max_bounces == self.max_bounces and
+                (index.min_size, index.max_size) == (self.min_cells, self.max_cells)):
+            puzzle = self.puzzle_index.draw(self.difficulty, self.rng)
+            return puzzle.width, puzzle.height, puzzle.ball
+        width_in_cells = self.rng.randint(self.min_cells, self.max_cells)
+        height_in_cells = self.rng.randint(self.min_cells, self.max_cells)
+        boll_position = (self.rng.randint(1, width_in_cells - 1), self.rng.randint(1, height_in_cells - 1))
+        return width_in_cells, height_in_cells, boll_position
+
+    def startup_game(self, width_in_cells, height_in_cells, boll_position):
+        """
+        Запуск новой игры с новыми параметрами игрового поля
+        :param width_in_cells: ширина игрового поля в клеточках
+        :param height_in_cells: высота игрового поля в клеточках
+        :param boll_position: позиция шара
+        :return: None
+        """
+        self.width_in_cells = width_in_cells
+        self.height_in_cells = height_in_cells
+        self.boll_position = boll_position
+        self.board_width = (self.cell_size * width_in_cells +
+                            self.inner_line_thickness * (width_in_cells - 1) )
+        self.board_height = (self.cell_size * height_in_cells +
+                             self.inner_line_thickness * (height_in_cells - 1))
+        self.board_x, self.board_y = ((self.width - self.board_width) // 2, (self.height - self.board_height) // 2)
+        self.board_corners = [Point((self.board_x, self.board_y)),  # left top
+                              Point((self.board_x + self.board_width, self.board_y)),  # right top
+                              Point((self.board_x, self.board_y + self.board_height)),  # left bottom
+                              Point((self.board_x + self.board_width, self.board_y + self.board_height))]  # rth bottom
+        self.intersections_coordinates = IntersectionGrid(self.board_x, self.board_y,
+                                                          self.cell_size + self.inner_line_thickness,
+                                                          width_in_cells, height_in_cells)
+        self.boll_coordinates = self.intersections_coordinates[self.boll_position]
+        self.pocket_coordinates = ((self.board_x, self.board_y),
+                                   (self.board_x + self.board_width, self.board_y),
+                                   (self.board_x, self.board_y + self.board_height),
+                                   (self.board_x + self.board_width, self.board_y + self.board_height))
+        self.aim_coordinates = None
+        self.aim_position = None
+        self.aim_direction = None
+        self.intersect_points = []
+        self.hit_lines_len = None
+        self.hit_lines_table = []
+        self.hit_path = None
+        self.hit_path_done = None
+        self.ball_in_pocket = None
+        self.hit_it = None
+        self.hit_path_len = None
+        self.set_hit_enabled(True)
+        self.game_stage = 'select_aim'
+        self.board_changed()
+
+    def set_hit_enabled(self, enabled):
+        """
+        Разрешает или запрещает удар по шару
+        :param enabled: True или False
+        :return: None
+        """
+        self.hit_enabled = enabled
+
+    def board_changed(self):
+        """
+        Вызывается при изменении поля, метки прицеливания или начале удара
+        :return: None
+        """
+
+    def locate_intersection(self, pos):
+        """
+        Находит пересечение, в квадрат вокруг которого попадает точка, за O(1) по разметке поля
+        :param pos: координаты точки на экране
+        :return: позиция пересечения в клетках или None
+        """
+        step = self.cell_size + self.inner_line_thickness
+        x = round((pos[0] - self.board_x) / step)
+        y = round((pos[1] - self.board_y) / step)
+        if not (0 < x < self.width_in_cells and 0 < y < self.height_in_cells):
+            return None
+        if (abs(pos[0] - self.board_x - x * step) <= self.intersections_radius and
+                abs(pos[1] - self.board_y - y * step) <= self.intersections_radius):
+            return x, y
+        return None
+
+    def hit_intersection(self, pos):
+        """
+        Возвращает True в случае, если указатель мыши на метке пересечения (кроме пересечения под шаром)
+        :param pos: позиция указателя мыши
+        :return: возвращает True в случае, если указатель мыши на пересечении или False
+        """
+        position = self.locate_intersection(pos)
+        if position is None or position == self.boll_position:
+            return False
+        coordinates = self.intersections_coordinates[position]
+        # закрашенный круг радиуса r покрывает пиксели с центрами не дальше r от (x - 0.5, y - 0.5)
+        return ((pos[0] - coordinates.x + 0.5) ** 2 + (pos[1] - coordinates.y + 0.5) ** 2 <=
+                self.intersections_radius ** 2)
+
+    def set_aim(self, pos):
+        """
+        Выбирает одно из пересечений как метку для прицеливания
+        :param pos:
+        :return:
+        """
+        position = self.locate_intersection(pos)
+        if position is not None:
+            self.set_aim_position(position)
+            return self.aim_coordinates
+
+    def set_aim_position(self, position):
+        """
+        Устанавливает метку для прицеливания на пересечение с заданной позицией
+        :param position: позиция пересечения в клетках
+        :return: None
+        """
+        self.aim_coordinates = self.intersections_coordinates[position]
+        self.aim_position = position
+        self.aim_direction = None
+        self.hit_it = False
+        self.set_hit_enabled(True)
+        self.game_stage = 'select_aim'
+        self.board_changed()
+
+    def set_aim_direction(self, aim_direction):
+        """
+        Свободное прицеливание: удар в произвольном направлении (не обязательно через пересечение).
+        Метка прицеливания ставится в точку первого касания борта
+        :param aim_direction: направление удара (dx, dy), ненулевое
+        :return: None
+        """
+        points, _ = self.free_trajectory(aim_direction, 1)
+        self.aim_coordinates = self.cell_to_point(points[0])
+        self.aim_position = None
+        self.aim_direction = aim_direction
+        self.hit_it = False
+        self.set_hit_enabled(True)
+        self.game_stage = 'select_aim'
+        self.board_changed()
+
+    def free_trajectory(self, aim_direction, limit):
+        """
+        Траектория удара в произвольном направлении. В отличие от ударов по пересечениям, шар попадает в лузу,
+        и когда касается борта не дальше pocket_radius от угла
+        :param aim_direction: направление удара (dx, dy), ненулевое
+        :param limit: максимальное число касаний бортов
+        :return: (точки касания бортов в клетках, индекс лузы или None)
+        """
+        pocket_size = self.pocket_radius / (self.cell_size + self.inner_line_thickness)
+        points = []
+        pocket = None
+        for bounce in islice(cast(self.boll_position, aim_direction,
+                                  (0, 0, self.width_in_cells, self.height_in_cells), pocket_size), limit):
+            points.append(bounce.point)
+            pocket = bounce.pocket
+        return points, pocket
+
+    def cell_to_point(self, cell):
+        """
+        Переводит координаты в клетках (возможно дробные) в координаты на экране
+        :param cell: координаты в клетках
+        :return: Point
+        """
+        step = self.cell_size + self.inner_line_thickness
+        # округление убирает погрешность вычислений (16.999999999999996 вместо 17), чтобы не сдвигать пиксели
+        return Point((min(round(self.board_x + cell[0] * step, 9), self.board_x + self.board_width),
+                      min(round(self.board_y + cell[1] * step, 9), self.board_y + self.board_height)))
+
+    def hit_lines_args(self, shot_cache=True):
+        """
+        Все, от чего зависит траектория удара по текущему прицелу
+        :param shot_cache: передавать ли кэш траекторий shot_cache
+        :return: аргументы hit_lines
+        """
+        pocket_size = self.pocket_radius / (self.cell_size + self.inner_line_thickness)
+        return (self.width_in_cells, self.height_in_cells, self.boll_position, self.aim_position,
+                self.aim_direction, self.max_bounces, pocket_size, self.shot_cache if shot_cache else None)
+
+    def hit_lines_job(self, shot_cache=True):
+        """
+        Расчет траектории удара для выполнения в другом потоке или процессе: не зависит
+        от последующих изменений игры
+        :param shot_cache: пользоваться ли кэшем траекторий (для пула процессов - нет: кэш не передается
+            между процессами)
+        :return: функция без аргументов, возвращающая результат solved_hit_lines
+        """
+        return partial(solved_hit_lines, *self.hit_lines_args(shot_cache))
+
+    def calculate_hit_lines(self):
+        """
+        Расчет траектории движения шара после удара в заданном направлении.
+        Траектория берется из кэша shot_cache, а без кэша исход удара решается сразу,
+        а точки касания бортов вычисляются лениво по ходу анимации
+        :return: None
+        """
+        self.apply_hit_lines(*hit_lines(*self.hit_lines_args()))
+
+    def apply_hit_lines(self, points, pocket):
+        """
+        Устанавливает рассчитанную траекторию удара
+        :param points: точки касания бортов в клетках
+        :param pocket: индекс лузы, в которую попадает шар, или None
+        :return: None
+        """
+        self.ball_in_pocket = None if pocket is None else self.board_corners[pocket]
+        self.start_hit_path(iter(points))
+
+    def start_hit_path(self, points):
+        """
+        Начинает новую траекторию удара
+        :param points: итератор точек касания бортов в клетках
+        :return: None
+        """
+        self.hit_path = points
+        self.hit_path_done = False
+        self.intersect_points = []
+        self.hit_lines_len = 0
+        self.hit_lines_table = []
+
+    def extend_hit_lines(self, path_len):
+        """
+        Дополняет траекторию точками касания бортов, пока ее длина не превысит path_len
+        :param path_len: требуемая длина траектории
+        :return: None
+        """
+        while self.hit_path and not self.hit_path_done and self.hit_lines_len <= path_len:
+            point = next(self.hit_path, None)
+            if point is None:
+                self.hit_path_done = True
+                break
+            prev_point = self.intersect_points[-1] if self.intersect_points else self.boll_coordinates
+            intersect_point = self.cell_to_point(point)
+            self.hit_lines_len += Vector((prev_point, intersect_point)).length()
+            self.hit_lines_table.append(self.hit_lines_len)
+            self.intersect_points.append(intersect_point)
+
+    def path_point(self, path_len):
+        """
+        Положение шара на траектории после прохождения пути path_len (двоичный поиск по накопленным длинам)
+        :param path_len: пройденный путь
+        :return: (число пройденных целиком отрезков, точка)
+        """
+        index = bisect_right(self.hit_lines_table, path_len)
+        if index == len(self.intersect_points):
+            return index, self.intersect_points[-1] if self.intersect_points else self.boll_coordinates
+        start_len = self.hit_lines_table[index - 1] if index else 0
+        prev_point = self.intersect_points[index - 1] if index else self.boll_coordinates
+        intersect_point = self.intersect_points[index]
+        ratio = (path_len - start_len) / (self.hit_lines_table[index] - start_len)
+        return index, prev_point + (intersect_point - prev_point) * ratio
+
+    def hit(self):
+        """
+        Запускает удар по шару в заданном направлении
+        :return: None
+        """
+        if self.aim_position or self.aim_direction:
+            self.hit_it = True
+            self.hit_path_len = 0
+            self.extend_hit_lines(self.hit_path_len)
+            self.set_hit_enabled(False)
+            self.game_stage = 'animation'
+            self.board_changed()
+
+    def update(self, dt=None):
+        """
+        Шаг анимации удара: продвигает шар на путь, пройденный за время dt,
+        и начисляет очки, когда траектория пройдена целиком
+        :param dt: время, прошедшее с прошлого кадра, в секундах (по умолчанию frame_time)
+        :return: None
+        """
+        if self.hit_it:
+            if self.hit_path_done and self.hit_path_len >= self.hit_lines_len:
+                if self.game_stage == 'animation':
+                    if self.ball_in_pocket:
+                        self.scores += self.pocket_scores
+                    else:
+                        self.scores += self.miss_scores
+                self.game_stage = 'after_animation'
+                return
+
+            # после долгой паузы (ожидание событий, перетаскивание окна) шар не перескакивает вперед
+            dt = self.frame_time if dt is None else min(dt, self.max_frame_time)
+            self.hit_path_len += self.hit_speed * dt
+            self.extend_hit_lines(self.hit_path_len)
+
+    def select_aim(self, position):
+        """
+        Ввод игрока: выбор метки прицеливания (щелчок по пересечению)
+        :param position: позиция пересечения в клетках
+        :return: None
+        """
+        self.set_aim_position(position)
+        self.calculate_hit_lines()
+
+    def select_direction(self, aim_direction):
+        """
+        Ввод игрока: свободное прицеливание в направлении aim_direction (нулевое направление не меняет прицел)
+        :param aim_direction: направление удара (dx, dy)
+        :return: None
+        """
+        if aim_direction[0] or aim_direction[1]:
+            self.set_aim_direction(aim_direction)
+            self.calculate_hit_lines()
+
+    def press_hit(self):
+        """
+        Ввод игрока: кнопка [Hit it!] (срабатывает, только если удар разрешен)
+        :return: None
+        """
+        if self.hit_enabled:
+            self.hit()
+
+    def press_next(self):
+        """
+        Ввод игрока: кнопка [Next] - новый раунд со случайными параметрами
+        :return: None
+        """
+        self.startup_game(*self.get_random_game_parameters())
+
+    def play_round(self, aim_position):
+        """
+        Разыгрывает удар по заданной метке без анимации
+        :param aim_position: позиция пересечения в клетках
+        :return: True, если шар попал в лузу
+        """
+        self.set_aim_position(aim_position)
+        self.calculate_hit_lines()
+        self.hit()
+        self.extend_hit_lines(math.inf)
+        self.hit_path_len = self.hit_lines_len
+        self.update()
+        return bool(self.ball_in_pocket)
+
+
+class SimulationResult(NamedTuple):
+    """
+    Итоги серии раундов: число раундов, попаданий в лузу и набранные очки
+    """
+    rounds: int
+    pockets: int
+    scores: int
+
+
+def simulate(rounds, seed=None, model=BilliardModel):
+    """
+    Максимально быстрая серия раундов со случайными полями и случайными метками.
+    Разметка поля в пикселях не строится: удар решается сразу в клетках по правилам model.
+    Как и в игре, метка не совпадает с шаром, поэтому поле 2x2 (одно пересечение) выбирается заново
+    :param rounds: число раундов
+    :param seed: зерно генератора случайных чисел
+    :param model: класс модели, правила которой используются
+    :return: SimulationResult
+    """
+    if model.max_cells < 3:
+        raise ValueError('boards of at most 2x2 cells have no aim point other than the ball')
+    rng = random.Random(seed)
+    randrange = rng.randrange
+    max_bounces = model.max_bounces
+    pockets = 0
+    for _ in range(rounds):
+        width_in_cells = height_in_cells = 2
+        while width_in_cells == height_in_cells == 2:
+            width_in_cells = randrange(model.min_cells, model.max_cells + 1)
+            height_in_cells = randrange(model.min_cells, model.max_cells + 1)
+        ball = aim = (randrange(1, width_in_cells), randrange(1, height_in_cells))
+        while aim == ball:
+            aim = (randrange(1, width_in_cells), randrange(1, height_in_cells))
+        if is_pocketed(solve(width_in_cells, height_in_cells, ball, aim), max_bounces):
+            pockets += 1
+    return SimulationResult(rounds, pockets, pockets * model.pocket_scores + (rounds - pockets) * model.miss_scores)
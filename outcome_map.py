@@ -0,0 +1,175 @@
+import math
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from model import BilliardModel
+
+# до такого размера поля обратные элементы берутся из таблицы, а не считаются алгоритмом Евклида
+INVERSE_TABLE_LIMIT = 64
+# до такого числа пересечений на поле решения кэшируются сразу для всех позиций шара
+BOARD_TABLE_LIMIT = 400
+
+
+class OutcomeMap(NamedTuple):
+    """
+    Исходы ударов по всем точкам прицеливания (в порядке Game.intersections_coordinates)
+    positions - позиции точек прицеливания в клетках, массив (N, 2)
+    valid - можно ли выбрать точку прицеливания (False для позиции шара: удар по ней не решается,
+            и значения остальных массивов для нее не имеют смысла)
+    scored - засчитывается ли попадание по правилам игры (луза среди первых max_bounces касаний бортов)
+    pocket - попадает ли шар в лузу при любом числе отскоков
+    pocket_index - индекс лузы (в порядке board_corners) или -1
+    bounces - число отскоков до лузы (для промахов - за период траектории, см. solver.Shot)
+    length - длина пути в клетках
+    """
+    positions: np.ndarray
+    valid: np.ndarray
+    scored: np.ndarray
+    pocket: np.ndarray
+    pocket_index: np.ndarray
+    bounces: np.ndarray
+    length: np.ndarray
+
+
+@lru_cache(maxsize=None)
+def _inverse_table(size):
+    """
+    Таблица обратных элементов: table[n, a] = a^-1 (mod n) для n <= size
+    """
+    table = np.zeros((size + 1, size + 1), dtype=np.int64)
+    for n in range(1, size + 1):
+        for a in range(n):
+            if math.gcd(a, n) == 1:
+                table[n, a] = pow(a, -1, n)
+    return table
+
+
+def _inverse(a, n, size):
+    """
+    Обратные элементы a по модулю n (a и n взаимно просты, n <= size)
+    """
+    if size <= INVERSE_TABLE_LIMIT:
+        return _inverse_table(size)[n, a % n]
+    # расширенный алгоритм Евклида
+    old_r, r = a % n, n.copy()
+    old_s, s = np.ones_like(a), np.zeros_like(a)
+    active = r != 0
+    while active.any():
+        q = old_r // np.where(active, r, 1)
+        old_r, r = np.where(active, r, old_r), np.where(active, old_r - q * r, r)
+        old_s, s = np.where(active, s, old_s), np.where(active, old_s - q * s, s)
+        active = r != 0
+    return old_s % n
+
+
+def _solve_congruence(a, b, m):
+    """
+    Решает сравнения a * t = b (mod m) поэлементно
+    :return: (ok, r, n) - решения t = r (mod n) там, где ok
+    """
+    g = np.gcd(a, m)
+    ok = b % g == 0
+    n = m // g
+    return ok, (b // g) * _inverse(a // g, n, m) % n, n
+
+
+def _crossings(start, end, period):
+    """
+    Количество кратных period строго между start и end (поэлементно)
+    """
+    lo = np.minimum(start, end)
+    hi = np.maximum(start, end)
+    return (hi - 1) // period - lo // period
+
+
+def _solve(width, height, ball, aim):
+    """
+    Векторное решение ударов развертки стола (см. solver.solve)
+    :param ball: позиции шара, массив (N, 2)
+    :param aim: позиции точек прицеливания, массив (N, 2)
+    :return: pocket, pocket_index, bounces, length
+    """
+    bx, by = ball[:, 0], ball[:, 1]
+    dx = aim[:, 0] - bx
+    dy = aim[:, 1] - by
+    # как и make_vector, при совпадении точек бьем вертикально вниз
+    dy[(dx == 0) & (dy == 0)] = 1
+    g = np.gcd(dx, dy)
+    dx //= g
+    dy //= g
+
+    ok_x, r1, n1 = _solve_congruence(dx % width, -bx % width, width)
+    ok_y, r2, n2 = _solve_congruence(dy % height, -by % height, height)
+    # китайская теорема об остатках для взаимно не простых модулей
+    g = np.gcd(n1, n2)
+    pocket = ok_x & ok_y & ((r2 - r1) % g == 0)
+    m2 = n2 // g
+    lcm = n1 * m2
+    t = (r1 + n1 * ((r2 - r1) // g * _inverse(n1 // g, m2, height) % m2)) % lcm
+    t = np.where(t == 0, lcm, t)
+
+    end_x = bx + t * dx
+    end_y = by + t * dy
+    pocket_index = np.where(pocket, (end_x // width) % 2 + (end_y // height) % 2 * 2, -1)
+    bounces = _crossings(bx, end_x, width) + _crossings(by, end_y, height)
+
+    # промахи: период замкнутой траектории
+    tx = 2 * width // np.gcd(dx, 2 * width)
+    ty = 2 * height // np.gcd(dy, 2 * height)
+    period = np.lcm(tx, ty)
+    t = np.where(pocket, t, period)
+    bounces = np.where(pocket, bounces, np.abs(period * dx) // width + np.abs(period * dy) // height)
+    return pocket, pocket_index.astype(np.int8), bounces, t * np.hypot(dx, dy)
+
+
+def _lattice(width, height):
+    """
+    Позиции пересечений в порядке Game.intersections_coordinates, массив (N, 2)
+    """
+    ax, ay = np.meshgrid(np.arange(1, width, dtype=np.int64),
+                         np.arange(1, height, dtype=np.int64), indexing='ij')
+    return np.stack((ax.ravel(), ay.ravel()), axis=1)
+
+
+@lru_cache(maxsize=64)
+def _board_table(width, height):
+    """
+    Исходы всех ударов поля для всех позиций шара: массивы (N, N), строка - позиция шара
+    """
+    positions = _lattice(width, height)
+    count = len(positions)
+    ball = np.repeat(positions, count, axis=0)
+    aim = np.tile(positions, (count, 1))
+    table = [positions] + [a.reshape(count, count) for a in _solve(width, height, ball, aim)]
+    for a in table:
+        a.flags.writeable = False
+    return table
+
+
+def outcome_map(width_in_cells, height_in_cells, boll_position, max_bounces=None):
+    """
+    Решает удары по всем точкам прицеливания поля одним векторным проходом.
+    Для небольших полей решения сразу для всех позиций шара кэшируются,
+    и результат - срезы этой таблицы (только для чтения)
+    :param width_in_cells: ширина игрового поля в клетках
+    :param height_in_cells: высота игрового поля в клетках
+    :param boll_position: позиция шара в клетках
+    :param max_bounces: максимальное число касаний бортов (по умолчанию - как в BilliardModel)
+    :return: OutcomeMap
+    """
+    if max_bounces is None:
+        max_bounces = BilliardModel.max_bounces
+    width, height = width_in_cells, height_in_cells
+    if (width - 1) * (height - 1) <= BOARD_TABLE_LIMIT:
+        positions, *table = _board_table(width, height)
+        row = (boll_position[0] - 1) * (height - 1) + boll_position[1] - 1
+        pocket, pocket_index, bounces, length = (a[row] for a in table)
+    else:
+        positions = _lattice(width, height)
+        ball = np.broadcast_to(np.array(boll_position, dtype=np.int64), positions.shape)
+        pocket, pocket_index, bounces, length = _solve(width, height, ball, positions)
+    valid = (positions[:, 0] != boll_position[0]) | (positions[:, 1] != boll_position[1])
+    scored = valid & pocket & (bounces < max_bounces)
+    return OutcomeMap(positions, valid, scored, pocket, pocket_index, bounces, length)
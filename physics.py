@@ -0,0 +1,405 @@
+"""
+Событийная модель движения нескольких шаров с радиусом, трением и столкновениями.
+
+Трение вязкое: скорость шара убывает как v(t) = v0 * exp(-friction * t), шар движется по прямой и проходит
+путь v0 * s(t), где s(t) = (1 - exp(-friction * t)) / friction. Множитель s(t) общий для всех шаров,
+если отсчитывать время от одного момента, поэтому время любого события (шар - шар, шар - борт, шар - луза)
+решается точно: квадратное или линейное уравнение относительно s, без шагов по времени.
+
+События хранятся в куче по времени. Отменять предсказания при изменении скорости шара не нужно:
+у каждого шара есть счетчик изменений скорости, и событие со старым значением счетчика просто пропускается.
+Обработка события пересчитывает предсказания только для его шаров - O(n) вместо O(n^2) на шаг.
+
+    python physics.py          # разбивка пирамиды из 15 шаров и сравнение с перебором пар на каждом шаге
+"""
+import heapq
+import math
+import time
+from typing import NamedTuple
+
+BALL, CUSHION, POCKET, STOP = range(4)
+EVENT_NAMES = ('ball', 'cushion', 'pocket', 'stop')
+
+# направления бортов для событий CUSHION
+VERTICAL, HORIZONTAL = range(2)
+
+# наименьшее сближение (скалярное произведение относительных положения и скорости), которое считается
+# сближением: при касании по касательной ошибка округления дает отрицательное значение порядка 1e-17
+APPROACH_EPSILON = 1e-9
+
+
+class Event(NamedTuple):
+    """
+    Обработанное событие
+    time - время события
+    kind - BALL, CUSHION, POCKET или STOP
+    ball - индекс шара
+    other - второй шар (BALL), VERTICAL или HORIZONTAL (CUSHION), индекс лузы (POCKET), None (STOP)
+    """
+    time: float
+    kind: int
+    ball: int
+    other: object
+
+
+class Ball:
+    """
+    Состояние шара в момент последнего изменения скорости t: положение и скорость.
+    Положение в другой момент вычисляется по закону движения с трением
+    """
+    __slots__ = ('x', 'y', 'vx', 'vy', 't', 'count', 'pocket')
+
+    def __init__(self, x, y, vx=0.0, vy=0.0, t=0.0):
+        self.x = x
+        self.y = y
+        self.vx = vx
+        self.vy = vy
+        self.t = t
+        # число изменений скорости: события, предсказанные раньше, недействительны
+        self.count = 0
+        self.pocket = None
+
+    def moving(self):
+        return self.vx != 0 or self.vy != 0
+
+
+class Simulation:
+    """
+    Стол width x height с лузами в углах и шарами одного радиуса и массы
+    :param width: ширина стола
+    :param height: высота стола
+    :param radius: радиус шара
+    :param pocket_radius: радиус лузы: шар падает, когда его центр ближе pocket_radius + radius к углу
+    :param friction: коэффициент вязкого трения (1/с), больше нуля
+    :param restitution: коэффициент восстановления при ударе шаров
+    :param cushion_restitution: коэффициент восстановления при ударе о борт
+    :param min_speed: скорость, ниже которой шар останавливается
+    """
+    # предел числа событий в один момент времени: защита от бесконечного цикла
+    max_events_per_moment = 10000
+
+    def __init__(self, width, height, radius, pocket_radius, friction=0.5, restitution=0.95,
+                 cushion_restitution=0.8, min_speed=0.01):
+        if friction <= 0:
+            raise ValueError('friction must be positive')
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.pocket_radius = pocket_radius
+        self.friction = friction
+        self.restitution = restitution
+        self.cushion_restitution = cushion_restitution
+        self.min_speed = min_speed
+        self.corners = ((0, 0), (width, 0), (0, height), (width, height))
+        self.balls = []
+        self.time = 0.0
+        self.queue = []
+        self.sequence = 0
+        self.predicted = 0
+        self.stale = 0
+        # число событий подряд в момент self.time
+        self.moment_events = 0
+
+    def add_ball(self, x, y, vx=0.0, vy=0.0):
+        """
+        Ставит шар на стол
+        :return: индекс шара
+        """
+        self.balls.append(Ball(x, y, vx, vy, self.time))
+        index = len(self.balls) - 1
+        self.predict(index)
+        return index
+
+    def strike(self, index, vx, vy):
+        """
+        Удар по шару: новая скорость в текущий момент
+        :return: None
+        """
+        self.set_velocity(index, vx, vy)
+        self.predict(index)
+
+    def state(self, index, t=None):
+        """
+        Положение и скорость шара в момент t
+        :return: (x, y, vx, vy)
+        """
+        ball = self.balls[index]
+        t = self.time if t is None else t
+        if not ball.moving():
+            return ball.x, ball.y, 0.0, 0.0
+        decay = math.exp(-self.friction * (t - ball.t))
+        s = (1 - decay) / self.friction
+        return ball.x + ball.vx * s, ball.y + ball.vy * s, ball.vx * decay, ball.vy * decay
+
+    def set_velocity(self, index, vx, vy):
+        """
+        Переносит состояние шара в текущий момент и задает ему скорость (предсказания шара устаревают)
+        """
+        ball = self.balls[index]
+        ball.x, ball.y, _, _ = self.state(index)
+        ball.vx, ball.vy = vx, vy
+        ball.t = self.time
+        ball.count += 1
+
+    def push(self, s, kind, index, other=None):
+        """
+        Добавляет в очередь событие, которое наступит, когда шары текущего момента пройдут путь с множителем s
+        """
+        if s * self.friction >= 1:
+            # трение остановит шары раньше
+            return
+        moment = self.time - math.log1p(-s * self.friction) / self.friction
+        other_count = self.balls[other].count if kind == BALL else None
+        self.sequence += 1
+        self.predicted += 1
+        heapq.heappush(self.queue, (moment, self.sequence, kind, index, other, self.balls[index].count, other_count))
+
+    def predict(self, index, exclude=None):
+        """
+        Предсказывает ближайшие события шара: остановку, борта, лузы и столкновения со всеми шарами
+        :param exclude: шар, столкновение с которым не предсказывается (только что столкнувшийся:
+            шары расходятся и без изменения скорости снова не встретятся)
+        """
+        ball = self.balls[index]
+        if ball.pocket is not None:
+            return
+        x, y, vx, vy = self.state(index)
+        r = self.radius
+        if ball.moving():
+            speed = math.hypot(vx, vy)
+            if speed <= self.min_speed:
+                self.push(0.0, STOP, index)
+            else:
+                self.push((1 - self.min_speed / speed) / self.friction, STOP, index)
+            # борта
+            if vx:
+                self.push(max(0.0, ((self.width - r if vx > 0 else r) - x) / vx), CUSHION, index, VERTICAL)
+            if vy:
+                self.push(max(0.0, ((self.height - r if vy > 0 else r) - y) / vy), CUSHION, index, HORIZONTAL)
+            # лузы
+            capture = self.pocket_radius + r
+            for pocket, (cx, cy) in enumerate(self.corners):
+                s = self.contact(x - cx, y - cy, vx, vy, capture)
+                if s is not None:
+                    self.push(s, POCKET, index, pocket)
+
+        # столкновения с остальными шарами (в том числе неподвижного шара с движущимися)
+        for other, other_ball in enumerate(self.balls):
+            if other == index or other == exclude or other_ball.pocket is not None:
+                continue
+            if not (ball.moving() or other_ball.moving()):
+                continue
+            ox, oy, ovx, ovy = self.state(other)
+            s = self.contact(x - ox, y - oy, vx - ovx, vy - ovy, r * 2)
+            if s is not None:
+                self.push(s, BALL, index, other)
+
+    @staticmethod
+    def contact(dx, dy, dvx, dvy, distance):
+        """
+        Наименьший множитель пути s >= 0, при котором точки, сближающиеся со скоростью (dvx, dvy),
+        оказываются на расстоянии distance
+        :param dx, dy: положение первой точки относительно второй
+        :param dvx, dvy: скорость первой точки относительно второй
+        :return: s или None, если не сближаются (движение по касательной тоже не сближение)
+        """
+        b = dx * dvx + dy * dvy
+        if b > -APPROACH_EPSILON:
+            return None
+        c = dx * dx + dy * dy - distance * distance
+        if c <= 0:
+            return 0.0
+        a = dvx * dvx + dvy * dvy
+        discriminant = b * b - a * c
+        if discriminant < 0:
+            return None
+        return c / (-b + math.sqrt(discriminant))
+
+    def step(self):
+        """
+        Обрабатывает ближайшее действительное событие
+        :return: Event или None, если все шары остановились
+        """
+        while self.queue:
+            moment, _, kind, index, other, count, other_count = heapq.heappop(self.queue)
+            ball = self.balls[index]
+            if ball.count != count or (kind == BALL and self.balls[other].count != other_count):
+                self.stale += 1
+                continue
+            if ball.pocket is not None or (kind == BALL and self.balls[other].pocket is not None):
+                self.stale += 1
+                continue
+            if kind == BALL and not self.approaching(index, other, moment):
+                # касание по касательной или расхождение: скорости не меняются, копии события в очереди
+                # с теми же счетчиками тоже пропускаются здесь
+                self.stale += 1
+                continue
+            if moment == self.time:
+                self.moment_events += 1
+                if self.moment_events > self.max_events_per_moment:
+                    raise RuntimeError(f'more than {self.max_events_per_moment} events at t={moment}')
+            else:
+                self.moment_events = 1
+            self.time = moment
+            if kind == STOP:
+                self.set_velocity(index, 0.0, 0.0)
+            elif kind == CUSHION:
+                _, _, vx, vy = self.state(index)
+                if other == VERTICAL:
+                    vx = -vx * self.cushion_restitution
+                else:
+                    vy = -vy * self.cushion_restitution
+                self.set_velocity(index, vx, vy)
+            elif kind == POCKET:
+                self.set_velocity(index, 0.0, 0.0)
+                ball.pocket = other
+            else:
+                self.collide(index, other)
+            if kind == BALL:
+                self.predict(index, other)
+                self.predict(other, index)
+            else:
+                self.predict(index)
+            return Event(moment, kind, index, other if kind != STOP else None)
+        return None
+
+    def approaching(self, index, other, t=None):
+        """
+        Сближаются ли шары в момент t - то же условие, что в contact
+        """
+        x, y, vx, vy = self.state(index, t)
+        ox, oy, ovx, ovy = self.state(other, t)
+        return (x - ox) * (vx - ovx) + (y - oy) * (vy - ovy) <= -APPROACH_EPSILON
+
+    def collide(self, index, other):
+        """
+        Упругий (с потерями restitution) удар двух шаров одинаковой массы.
+        Нормаль та же, что в contact: от шара other к шару index; шары, которые не сближаются вдоль нее,
+        скоростями не обмениваются
+        """
+        x, y, vx, vy = self.state(index)
+        ox, oy, ovx, ovy = self.state(other)
+        nx, ny = x - ox, y - oy
+        length = math.hypot(nx, ny)
+        nx, ny = nx / length, ny / length
+        # скорость сближения: минус проекция относительной скорости на нормаль
+        approach = -((vx - ovx) * nx + (vy - ovy) * ny)
+        if approach <= 0:
+            return
+        impulse = (1 + self.restitution) / 2 * approach
+        self.set_velocity(index, vx + impulse * nx, vy + impulse * ny)
+        self.set_velocity(other, ovx - impulse * nx, ovy - impulse * ny)
+
+    def run(self, until=math.inf):
+        """
+        Обрабатывает события до остановки всех шаров или до момента until
+        :return: список Event
+        """
+        events = []
+        while self.queue and self.queue[0][0] <= until:
+            event = self.step()
+            if event is None:
+                break
+            events.append(event)
+        return events
+
+
+def rack(simulation, apex_x, apex_y, rows=5, gap=1e-6):
+    """
+    Ставит пирамиду шаров вершиной в (apex_x, apex_y), основанием вправо
+    :return: индексы шаров
+    """
+    spacing = simulation.radius * 2 + gap
+    indices = []
+    for row in range(rows):
+        for i in range(row + 1):
+            indices.append(simulation.add_ball(apex_x + row * spacing * math.sqrt(3) / 2,
+                                               apex_y + (i - row / 2) * spacing))
+    return indices
+
+
+def break_shot(width=10.0, height=5.0, speed=8.0):
+    """
+    Стандартная разбивка: пирамида из 15 шаров и биток
+    :return: Simulation
+    """
+    simulation = Simulation(width, height, radius=0.35, pocket_radius=0.4)
+    rack(simulation, width * 0.7, height / 2)
+    cue = simulation.add_ball(width * 0.2, height / 2 + 0.01)
+    simulation.strike(cue, speed, 0.0)
+    return simulation
+
+
+def brute_force(width=10.0, height=5.0, speed=8.0, dt=1e-3):
+    """
+    Для сравнения: та же разбивка с постоянным шагом по времени и проверкой всех пар шаров на каждом шаге.
+    Итог совпадает с событийной моделью лишь приблизительно: шары пирамиды касаются друг друга, и шаг по времени
+    разрешает перекрывшиеся пары в порядке индексов, а не в точные моменты касания, поэтому шары разлетаются
+    немного иначе. Так, при разбивке по умолчанию шар 14 здесь задевает зону угловой лузы (1 шар в лузе),
+    а в событийной модели уходит от нее другим путем (0 шаров в лузе)
+    :return: (время остановки, число шагов, число попавших в лузы шаров)
+    """
+    simulation = break_shot(width, height, speed)
+    r, friction = simulation.radius, simulation.friction
+    balls = [list(simulation.state(i)) for i in range(len(simulation.balls))]
+    pocketed = set()
+    t = 0.0
+    steps = 0
+    while any(vx or vy for i, (_, _, vx, vy) in enumerate(balls) if i not in pocketed):
+        steps += 1
+        t += dt
+        decay = math.exp(-friction * dt)
+        for i, ball in enumerate(balls):
+            if i in pocketed:
+                continue
+            ball[0] += ball[2] * dt
+            ball[1] += ball[3] * dt
+            ball[2] *= decay
+            ball[3] *= decay
+            if math.hypot(ball[2], ball[3]) < simulation.min_speed:
+                ball[2] = ball[3] = 0.0
+            if not r <= ball[0] <= width - r:
+                ball[2] = -ball[2] * simulation.cushion_restitution
+                ball[0] = min(max(ball[0], r), width - r)
+            if not r <= ball[1] <= height - r:
+                ball[3] = -ball[3] * simulation.cushion_restitution
+                ball[1] = min(max(ball[1], r), height - r)
+            for cx, cy in simulation.corners:
+                if math.hypot(ball[0] - cx, ball[1] - cy) <= simulation.pocket_radius + r:
+                    pocketed.add(i)
+                    ball[2] = ball[3] = 0.0
+        for i in range(len(balls)):
+            for j in range(i + 1, len(balls)):
+                if i in pocketed or j in pocketed:
+                    continue
+                a, b = balls[i], balls[j]
+                nx, ny = b[0] - a[0], b[1] - a[1]
+                length = math.hypot(nx, ny)
+                if length < r * 2:
+                    nx, ny = nx / length, ny / length
+                    approach = (a[2] - b[2]) * nx + (a[3] - b[3]) * ny
+                    if approach > 0:
+                        impulse = (1 + simulation.restitution) / 2 * approach
+                        a[2] -= impulse * nx
+                        a[3] -= impulse * ny
+                        b[2] += impulse * nx
+                        b[3] += impulse * ny
+    return t, steps, len(pocketed)
+
+
+if __name__ == '__main__':
+    start = time.perf_counter()
+    simulation = break_shot()
+    events = simulation.run()
+    elapsed = time.perf_counter() - start
+    counts = [sum(event.kind == kind for event in events) for kind in range(len(EVENT_NAMES))]
+    print(f'event-driven: {len(simulation.balls)} balls, {len(events)} events '
+          f'({", ".join(f"{n} {name}" for n, name in zip(counts, EVENT_NAMES))}), '
+          f'{simulation.predicted} predictions, {simulation.stale} stale skipped, '
+          f'all stopped at t={simulation.time:.2f} s, computed in {elapsed * 1000:.1f} ms')
+
+    start = time.perf_counter()
+    stopped, steps, pocketed = brute_force()
+    elapsed = time.perf_counter() - start
+    print(f'fixed step 1 ms, all pairs per step: {steps} steps, {pocketed} pocketed, '
+          f'stopped at t={stopped:.2f} s, computed in {elapsed * 1000:.1f} ms')
@@ -0,0 +1,128 @@
+import csv
+import json
+import math
+import time
+from array import array
+
+
+class FrameProfiler:
+    """
+    Профилировщик фаз кадра. Кадр размечается вызовами mark(фаза): каждая отметка записывает время,
+    прошедшее с предыдущей, поэтому фазы не вкладываются друг в друга и в сумме дают весь кадр.
+    Замеры хранятся в кольцевом буфере на capacity кадров (по массиву на фазу, пропуск фазы - nan).
+    В выключенном состоянии каждая отметка - один вызов с проверкой флага
+    """
+    def __init__(self, capacity=600, enabled=False):
+        self.capacity = capacity
+        self.enabled = enabled
+        self.samples = {}
+        self.frames = 0
+        self.last_time = None
+
+    def enable(self, enabled=True):
+        """
+        Включает или выключает сбор замеров
+        :param enabled: True или False
+        :return: None
+        """
+        self.enabled = enabled
+        self.last_time = None
+
+    def start_frame(self):
+        """
+        Начало кадра: от этой отметки отсчитывается первая фаза
+        :return: None
+        """
+        if not self.enabled:
+            return
+        if self.last_time is not None:
+            self.frames += 1
+        index = self.frames % self.capacity
+        for values in self.samples.values():
+            values[index] = math.nan
+        self.last_time = time.perf_counter()
+
+    def mark(self, phase):
+        """
+        Конец фазы кадра
+        :param phase: имя фазы
+        :return: None
+        """
+        if not self.enabled or self.last_time is None:
+            return
+        now = time.perf_counter()
+        values = self.samples.get(phase)
+        if values is None:
+            values = self.samples[phase] = array('d', [math.nan]) * self.capacity
+        values[self.frames % self.capacity] = now - self.last_time
+        self.last_time = now
+
+    def phase_samples_raw(self, phase):
+        """
+        Замеры фазы в порядке записи, с пропусками (nan), по одному на каждый кадр в буфере
+        :param phase: имя фазы
+        :return: array длительностей в секундах
+        """
+        values = self.samples[phase]
+        index = self.frames % self.capacity + 1
+        if self.frames < self.capacity:
+            return values[:index]
+        return values[index:] + values[:index]
+
+    def phase_samples(self, phase):
+        """
+        Замеры фазы в порядке записи, без пропусков
+        :param phase: имя фазы
+        :return: список длительностей в секундах
+        """
+        return [value for value in self.phase_samples_raw(phase) if not math.isnan(value)]
+
+    def summary(self):
+        """
+        Скользящая статистика по фазам в миллисекундах
+        :return: словарь фаза -> {'count', 'mean', 'p50', 'p95', 'p99', 'max'}
+        """
+        result = {}
+        for phase in self.samples:
+            values = sorted(self.phase_samples(phase))
+            if not values:
+                continue
+            count = len(values)
+            result[phase] = {'count': count,
+                             'mean': sum(values) / count * 1000,
+                             'p50': values[count // 2] * 1000,
+                             'p95': values[min(count - 1, int(count * 0.95))] * 1000,
+                             'p99': values[min(count - 1, int(count * 0.99))] * 1000,
+                             'max': values[-1] * 1000}
+        return result
+
+    def dump(self, path):
+        """
+        Сохраняет замеры для анализа: .csv - по строке на кадр, .json - замеры и статистика
+        :param path: путь к файлу (формат по расширению)
+        :return: None
+        """
+        phases = list(self.samples)
+        columns = [self.phase_samples_raw(phase) for phase in phases]
+        first_frame = self.frames + 1 - len(columns[0]) if columns else 0
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(['frame'] + phases)
+                for row, values in enumerate(zip(*columns)):
+                    writer.writerow([first_frame + row] + ['' if math.isnan(value) else value for value in values])
+        else:
+            with open(path, 'w') as file:
+                json.dump({'first_frame': first_frame, 'units': 's',
+                           'samples': {phase: [None if math.isnan(value) else value for value in column]
+                                       for phase, column in zip(phases, columns)},
+                           'summary_ms': self.summary()}, file, indent=2)
+
+    def clear(self):
+        """
+        Удаляет все замеры
+        :return: None
+        """
+        self.samples.clear()
+        self.frames = 0
+        self.last_time = None
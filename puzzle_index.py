@@ -0,0 +1,195 @@
+"""
+Индекс решаемых раундов: для каждого поля и позиции шара заранее решены удары по всем меткам.
+Индекс строится один раз (python puzzle_index.py) и при запуске игры отображается в память,
+так что случайный раунд нужной сложности выбирается за O(1) без решения ударов и без загрузки таблицы.
+
+Формат файла (little-endian):
+    заголовок HEADER: сигнатура, версия, max_bounces, размеры полей, число уровней сложности
+    таблица уровней: по LEVEL (смещение первого раунда, число раундов) на уровень
+    раунды ROUND, упорядоченные по сложности
+    удары: по байту на пересечение поля в порядке Game.intersections_coordinates
+        (старший бит - шар попадает в лузу, младшие 7 бит - число отскоков до лузы, NOT_AIM - позиция шара)
+"""
+import argparse
+import mmap
+import random
+import struct
+from typing import NamedTuple
+
+MAGIC = b'BPZI'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBB')
+LEVEL = struct.Struct('<II')
+ROUND = struct.Struct('<BBBBBBBBI')
+
+POCKET_BIT = 0x80
+BOUNCES_MASK = 0x7F
+NOT_AIM = 0xFF
+# наибольший размер поля: число меток (MAX_SIZE - 1) ** 2 - 1 должно помещаться в байт записи ROUND
+MAX_SIZE = 17
+
+# уровни сложности: раунды делятся на равные по числу группы по возрастанию оценки сложности
+DIFFICULTIES = ('easy', 'normal', 'hard')
+
+
+class PuzzleRound(NamedTuple):
+    """
+    Раунд из индекса
+    width, height - размер поля в клетках, ball - позиция шара
+    aims - число меток, pockets - сколько из них загоняют шар в лузу не больше чем за max_bounces касаний
+    min_bounces - наименьшее число отскоков среди таких ударов
+    score - оценка сложности 0..255
+    shots_offset - смещение ударов раунда в файле
+    """
+    width: int
+    height: int
+    ball: tuple
+    aims: int
+    pockets: int
+    min_bounces: int
+    score: int
+    shots_offset: int
+
+
+def difficulty_score(aims, pockets, min_bounces, max_bounces):
+    """
+    Оценка сложности раунда 0..255: в основном доля меток-промахов, в меньшей степени - отскоки
+    самого короткого выигрышного удара
+    """
+    miss_share = (aims - pockets) / aims
+    bounce_share = min_bounces / max(max_bounces - 1, 1)
+    return round(255 * (0.75 * miss_share + 0.25 * bounce_share))
+
+
+def build(path, min_size=5, max_size=10, max_bounces=None, levels=len(DIFFICULTIES)):
+    """
+    Строит индекс перебором всех полей, позиций шара и меток
+    :param path: путь к файлу индекса
+    :param min_size: наименьший размер поля в клетках, не меньше 2
+    :param max_size: наибольший размер поля в клетках, не больше MAX_SIZE
+    :param max_bounces: максимальное число касаний бортов (по умолчанию - как в BilliardModel)
+    :param levels: число уровней сложности
+    :return: число решаемых раундов в индексе
+    """
+    import numpy as np
+    from model import BilliardModel
+    from outcome_map import outcome_map
+
+    if not 2 <= min_size <= max_size <= MAX_SIZE:
+        raise ValueError(f'board sizes must satisfy 2 <= min_size <= max_size <= {MAX_SIZE}')
+    if max_bounces is None:
+        max_bounces = BilliardModel.max_bounces
+    rounds = []
+    shots = bytearray()
+    for width in range(min_size, max_size + 1):
+        for height in range(min_size, max_size + 1):
+            for x in range(1, width):
+                for y in range(1, height):
+                    outcomes = outcome_map(width, height, (x, y), max_bounces)
+                    codes = np.minimum(outcomes.bounces, BOUNCES_MASK - 1).astype(np.uint8)
+                    codes |= np.where(outcomes.pocket, POCKET_BIT, 0).astype(np.uint8)
+                    codes[~outcomes.valid] = NOT_AIM
+                    won = outcomes.scored
+                    pockets = int(won.sum())
+                    if not pockets:
+                        continue
+                    aims = int(outcomes.valid.sum())
+                    min_bounces = int(outcomes.bounces[won].min())
+                    score = difficulty_score(aims, pockets, min_bounces, max_bounces)
+                    rounds.append((score, min_bounces, width, height, x, y, aims, pockets, len(shots)))
+                    shots += codes.tobytes()
+    rounds.sort()
+
+    records_offset = HEADER.size + LEVEL.size * levels
+    shots_offset = records_offset + ROUND.size * len(rounds)
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_bounces, min_size, max_size, levels))
+        for level in range(levels):
+            start = len(rounds) * level // levels
+            end = len(rounds) * (level + 1) // levels
+            file.write(LEVEL.pack(start, end - start))
+        for score, min_bounces, width, height, x, y, aims, pockets, offset in rounds:
+            file.write(ROUND.pack(width, height, x, y, aims, pockets, min_bounces, score, shots_offset + offset))
+        file.write(shots)
+    return len(rounds)
+
+
+class PuzzleIndex:
+    """
+    Индекс решаемых раундов, отображенный в память (см. описание формата в начале модуля)
+    """
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_bounces, self.min_size, self.max_size, levels = HEADER.unpack_from(self.buffer)
+        if magic != MAGIC or version != VERSION:
+            self.buffer.close()
+            raise ValueError(f'{path}: not a puzzle index of version {VERSION}')
+        self.levels = [LEVEL.unpack_from(self.buffer, HEADER.size + LEVEL.size * level) for level in range(levels)]
+        self.records_offset = HEADER.size + LEVEL.size * levels
+        self.rounds = sum(count for _, count in self.levels)
+
+    def __len__(self):
+        return self.rounds
+
+    def level(self, difficulty):
+        """
+        Номер уровня сложности
+        :param difficulty: имя из DIFFICULTIES или номер уровня
+        :return: номер уровня
+        """
+        if isinstance(difficulty, str):
+            difficulty = DIFFICULTIES.index(difficulty)
+        if not 0 <= difficulty < len(self.levels):
+            raise ValueError(f'no difficulty level {difficulty}')
+        return difficulty
+
+    def round(self, number):
+        """
+        Раунд по номеру (раунды упорядочены по сложности)
+        :param number: номер раунда 0..len(self)-1
+        :return: PuzzleRound
+        """
+        width, height, x, y, aims, pockets, min_bounces, score, shots_offset = ROUND.unpack_from(
+            self.buffer, self.records_offset + ROUND.size * number)
+        return PuzzleRound(width, height, (x, y), aims, pockets, min_bounces, score, shots_offset)
+
+    def draw(self, difficulty=None, rng=random):
+        """
+        Случайный решаемый раунд
+        :param difficulty: уровень сложности (имя или номер), None - любой
+        :param rng: генератор случайных чисел
+        :return: PuzzleRound
+        """
+        if difficulty is None:
+            return self.round(rng.randrange(self.rounds))
+        start, count = self.levels[self.level(difficulty)]
+        return self.round(start + rng.randrange(count))
+
+    def shots(self, puzzle):
+        """
+        Коды ударов раунда (см. POCKET_BIT, BOUNCES_MASK, NOT_AIM) без копирования
+        :param puzzle: PuzzleRound
+        :return: memoryview, по байту на пересечение в порядке Game.intersections_coordinates
+        """
+        count = (puzzle.width - 1) * (puzzle.height - 1)
+        return memoryview(self.buffer)[puzzle.shots_offset:puzzle.shots_offset + count]
+
+    def close(self):
+        """
+        Закрывает отображение файла
+        :return: None
+        """
+        self.buffer.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Построение индекса решаемых раундов')
+    parser.add_argument('--output', default='puzzles.bin')
+    parser.add_argument('--min-size', type=int, default=5)
+    parser.add_argument('--max-size', type=int, default=10, help=f'не больше {MAX_SIZE}')
+    args = parser.parse_args()
+    if not 2 <= args.min_size <= args.max_size <= MAX_SIZE:
+        parser.error(f'--min-size and --max-size must satisfy 2 <= MIN_SIZE <= MAX_SIZE <= {MAX_SIZE}')
+    total = build(args.output, args.min_size, args.max_size)
+    print(f'{total} solvable rounds written to {args.output}')
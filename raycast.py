@@ -0,0 +1,78 @@
+import math
+from typing import NamedTuple
+
+# Борта: верхний, левый, правый, нижний
+TOP, LEFT, RIGHT, BOTTOM = range(4)
+
+# относительная точность, с которой одновременное касание двух бортов считается попаданием в лузу
+CORNER_EPS = 1e-9
+
+
+class Bounce(NamedTuple):
+    """
+    Касание борта лучом
+    point - точка касания (x, y)
+    side - борт (TOP, LEFT, RIGHT, BOTTOM); при попадании в лузу - вертикальный борт угла
+    distance - длина пути от начала луча до точки касания
+    pocket - индекс лузы (в порядке board_corners) или None
+    """
+    point: tuple
+    side: int
+    distance: float
+    pocket: object
+
+
+def cast(origin, direction, rect, pocket_size=0.0):
+    """
+    Луч внутри прямоугольника с отражением от сторон. Касания вычисляются лениво (slab-тест по осям),
+    поэтому можно получить сколько угодно отскоков, не считая лишних.
+    Генератор заканчивается, когда луч попадает в угол (лузу)
+    :param origin: начало луча (x, y) внутри прямоугольника
+    :param direction: направление луча (dx, dy), ненулевое
+    :param rect: прямоугольник (left, top, width, height)
+    :param pocket_size: размер лузы вдоль стороны: касание ближе к углу тоже считается попаданием в лузу
+    :return: генератор Bounce
+    """
+    left, top, width, height = rect
+    right = left + width
+    bottom = top + height
+    x, y = origin
+    dx, dy = direction
+    speed = math.hypot(dx, dy)
+    eps = CORNER_EPS * (width + height) / speed
+    distance = 0.0
+    while True:
+        # время до вертикальной и горизонтальной стороны
+        tx = (right - x) / dx if dx > 0 else (left - x) / dx if dx < 0 else math.inf
+        ty = (bottom - y) / dy if dy > 0 else (top - y) / dy if dy < 0 else math.inf
+        corner = abs(tx - ty) <= eps
+        if tx <= ty or corner:
+            t = tx
+            x = right if dx > 0 else left
+            y = y + dy * t
+            side = RIGHT if dx > 0 else LEFT
+            if corner:
+                y = bottom if dy > 0 else top
+            dx = -dx
+        else:
+            t = ty
+            x = x + dx * t
+            y = bottom if dy > 0 else top
+            side = BOTTOM if dy > 0 else TOP
+            dy = -dy
+        distance += t * speed
+        if not corner and pocket_size:
+            # касание рядом с углом: расстояние вдоль стороны до ближайшего угла
+            if side in (LEFT, RIGHT):
+                corner = min(y - top, bottom - y) <= pocket_size
+                pocket = (side == RIGHT) + (bottom - y < y - top) * 2
+            else:
+                corner = min(x - left, right - x) <= pocket_size
+                pocket = (right - x < x - left) + (side == BOTTOM) * 2
+            if corner:
+                yield Bounce((x, y), side, distance, pocket)
+                return
+        if corner:
+            yield Bounce((x, y), side, distance, (x == right) + (y == bottom) * 2)
+            return
+        yield Bounce((x, y), side, distance, None)
@@ -0,0 +1,183 @@
+"""
+Запись ввода игрока и воспроизведение партии без окна.
+
+Журнал - двоичный файл, в который записи только дописываются:
+    заголовок HEADER: сигнатура, версия, зерно генератора игры, размер окна, индекс раундов,
+        диапазон размеров случайного поля
+    записи RECORD: (номер кадра, вид, a, b)
+        AIM - выбор метки (a, b - позиция пересечения в клетках), HIT - [Hit it!], NEXT - [Next],
+        AIM_DIRECTION - свободное прицеливание (a, b - направление удара),
+        CHECK - контрольная точка (a - очки, b - номер стадии в STAGES) после шага анимации кадра
+
+При записи игра идет с постоянным шагом frame_time на кадр, поэтому состояние определяется
+номером кадра. Воспроизведение не ждет кадров: пока нет анимации, сразу переходит к следующей записи.
+
+    python replay.py session.log
+"""
+import argparse
+import struct
+import sys
+import time
+from typing import NamedTuple
+
+from model import BilliardModel
+
+MAGIC = b'BRLG'
+VERSION = 2
+HEADER = struct.Struct('<4sBqHHBHH')
+RECORD = struct.Struct('<IBhh')
+# диапазон зерна генератора, которое помещается в заголовок
+SEED_RANGE = range(-2 ** 63, 2 ** 63)
+
+AIM, HIT, NEXT, CHECK, AIM_DIRECTION = range(5)
+STAGES = ('select_aim', 'animation', 'after_animation')
+
+# как игра выбирала раунды: вслепую или из индекса решаемых раундов (с уровнем сложности или любым)
+PUZZLES_NONE = 0
+PUZZLES_ANY = 1
+PUZZLES_LEVEL = 2
+
+
+class InputRecorder:
+    """
+    Журнал ввода игрока. Каждая запись сразу дописывается в файл
+    """
+    def __init__(self, path, game):
+        self.file = open(path, 'wb')
+        if game.puzzle_index is None:
+            puzzles = PUZZLES_NONE
+        elif game.difficulty is None:
+            puzzles = PUZZLES_ANY
+        else:
+            puzzles = PUZZLES_LEVEL + game.puzzle_index.level(game.difficulty)
+        self.file.write(HEADER.pack(MAGIC, VERSION, game.seed, game.width, game.height, puzzles,
+                                    game.min_cells, game.max_cells))
+        self.file.flush()
+
+    def record(self, frame, kind, a=0, b=0):
+        """
+        Дописывает запись в журнал
+        :param frame: номер кадра
+        :param kind: вид записи (AIM, HIT, NEXT, CHECK, AIM_DIRECTION)
+        :param a: первый параметр записи
+        :param b: второй параметр записи
+        :return: None
+        """
+        self.file.write(RECORD.pack(frame, kind, a, b))
+        self.file.flush()
+
+    def check(self, frame, game):
+        """
+        Дописывает контрольную точку с очками и стадией игры
+        :param frame: номер кадра
+        :param game: игра
+        :return: None
+        """
+        self.record(frame, CHECK, game.scores, STAGES.index(game.game_stage))
+
+    def close(self):
+        """
+        Закрывает журнал
+        :return: None
+        """
+        self.file.close()
+
+
+class ReplayResult(NamedTuple):
+    """
+    Итог воспроизведения: число кадров, событий ввода и контрольных точек, очки и расхождения
+    mismatches - список (кадр, ожидалось (очки, стадия), получено (очки, стадия))
+    """
+    frames: int
+    events: int
+    checks: int
+    scores: int
+    mismatches: list
+
+
+def read_log(path):
+    """
+    Читает журнал
+    :param path: путь к журналу
+    :return: (seed, width, height, puzzles, min_cells, max_cells, список записей (кадр, вид, a, b))
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    magic, version, seed, width, height, puzzles, min_cells, max_cells = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path}: not an input log of version {VERSION}')
+    # недописанная последняя запись (игра была прервана) отбрасывается
+    end = HEADER.size + (len(data) - HEADER.size) // RECORD.size * RECORD.size
+    return seed, width, height, puzzles, min_cells, max_cells, list(RECORD.iter_unpack(data[HEADER.size:end]))
+
+
+def replay(path, puzzle_index=None, model=BilliardModel):
+    """
+    Воспроизводит партию по журналу на модели игры без отрисовки и без ожидания кадров
+    :param path: путь к журналу
+    :param puzzle_index: индекс решаемых раундов (нужен, если партия играла по индексу)
+    :param model: класс модели игры
+    :return: ReplayResult
+    """
+    seed, width, height, puzzles, min_cells, max_cells, records = read_log(path)
+    if puzzles != PUZZLES_NONE and puzzle_index is None:
+        raise ValueError(f'{path}: the session was played with a puzzle index, pass it to replay')
+
+    # правила выбора раундов - как в записанной партии
+    model = type(model.__name__, (model,), {
+        'min_cells': min_cells,
+        'max_cells': max_cells,
+        'puzzle_index': puzzle_index if puzzles != PUZZLES_NONE else None,
+        'difficulty': puzzles - PUZZLES_LEVEL if puzzles >= PUZZLES_LEVEL else None})
+    game = model(width, height, seed)
+
+    frame = 0
+    # шаг анимации кадра 0 уже сделан (в игре на первом кадре dt = 0)
+    game.update(0)
+    events = checks = 0
+    mismatches = []
+    for record_frame, kind, a, b in records:
+        while frame < record_frame:
+            if game.game_stage != 'animation':
+                # без анимации шаг кадра ничего не меняет
+                frame = record_frame - 1
+            frame += 1
+            game.update(game.frame_time)
+
+        if kind == CHECK:
+            checks += 1
+            expected, actual = (a, STAGES[b]), (game.scores, game.game_stage)
+            if expected != actual:
+                mismatches.append((frame, expected, actual))
+            continue
+        events += 1
+        if kind == AIM:
+            game.select_aim((a, b))
+        elif kind == HIT:
+            game.press_hit()
+        elif kind == NEXT:
+            game.press_next()
+        elif kind == AIM_DIRECTION:
+            game.select_direction((a, b))
+    return ReplayResult(frame + 1, events, checks, game.scores, mismatches)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Воспроизведение записанной партии без окна')
+    parser.add_argument('log')
+    parser.add_argument('--puzzles', metavar='PATH', help='индекс решаемых раундов, с которым шла партия')
+    args = parser.parse_args()
+
+    index = None
+    if args.puzzles:
+        from puzzle_index import PuzzleIndex
+        index = PuzzleIndex(args.puzzles)
+    start = time.perf_counter()
+    result = replay(args.log, index)
+    elapsed = time.perf_counter() - start
+    print(f'{result.frames} frames ({result.frames * BilliardModel.frame_time:.0f} s of play), '
+          f'{result.events} events, {result.checks} checks replayed in {elapsed * 1000:.1f} ms, '
+          f'scores {result.scores}')
+    for frame, expected, actual in result.mismatches:
+        print(f'frame {frame}: expected {expected}, got {actual}')
+    sys.exit(1 if result.mismatches else 0)
@@ -0,0 +1,139 @@
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import NamedTuple
+
+from raycast import cast
+from solver import Shot, solve, direction
+
+
+class Trajectory(NamedTuple):
+    """
+    Траектория удара в клетках
+    shot - исход удара solver.Shot
+    points - точки касания бортов (не больше limit), последняя - луза, если шар в нее попадает
+    """
+    shot: Shot
+    points: tuple
+
+
+def canonical(width, height, ball, vector):
+    """
+    Канонический представитель удара среди симметричных ему: по каждой оси выбирается отражение
+    с меньшей парой (координата шара, направление), для квадратного поля - меньший из вариантов
+    с транспонированием и без
+    :param width: ширина игрового поля в клетках
+    :param height: высота игрового поля в клетках
+    :param ball: позиция шара в клетках
+    :param vector: приведенное направление удара
+    :return: (ключ (ширина, высота, x, y, dx, dy), симметрия (отражение по x, отражение по y, транспонирование))
+    """
+    x, y = ball
+    dx, dy = vector
+    flip_x = (width - x, -dx) < (x, dx)
+    if flip_x:
+        x, dx = width - x, -dx
+    flip_y = (height - y, -dy) < (y, dy)
+    if flip_y:
+        y, dy = height - y, -dy
+    if width == height and (y, x, dy, dx) < (x, y, dx, dy):
+        return (width, height, y, x, dy, dx), (flip_x, flip_y, True)
+    return (width, height, x, y, dx, dy), (flip_x, flip_y, False)
+
+
+def _restore(symmetry, point, width, height):
+    """
+    Переводит точку канонического поля обратно на исходное поле width x height
+    """
+    flip_x, flip_y, transpose = symmetry
+    x, y = point
+    if transpose:
+        x, y = y, x
+    if flip_x:
+        x = width - x
+    if flip_y:
+        y = height - y
+    return x, y
+
+
+def trajectory(width, height, ball, vector, limit):
+    """
+    Решение удара без кэша
+    :param width: ширина игрового поля в клетках
+    :param height: высота игрового поля в клетках
+    :param ball: позиция шара в клетках
+    :param vector: приведенное направление удара (см. solver.direction)
+    :param limit: максимальное число точек касания бортов
+    :return: Trajectory
+    """
+    shot = solve(width, height, ball, (ball[0] + vector[0], ball[1] + vector[1]))
+    points = tuple(bounce.point for bounce in islice(cast(ball, vector, (0, 0, width, height)), limit))
+    return Trajectory(shot, points)
+
+
+class ShotCache:
+    """
+    Ограниченный LRU-кэш траекторий. Ключ приводится к каноническому виду по симметриям поля
+    (отражения по горизонтали и вертикали, для квадратного поля - еще и транспонирование),
+    поэтому симметричные удары занимают одну запись.
+    Кэшем можно пользоваться из нескольких потоков (например, из пула jobs.JobScheduler)
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.trajectories = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, width, height, ball, aim, limit):
+        """
+        Траектория удара из кэша (с вычислением при промахе)
+        :param width: ширина игрового поля в клетках
+        :param height: высота игрового поля в клетках
+        :param ball: позиция шара в клетках
+        :param aim: позиция точки прицеливания в клетках
+        :param limit: максимальное число точек касания бортов
+        :return: Trajectory в координатах исходного поля
+        """
+        key, symmetry = canonical(width, height, ball, direction(ball, aim))
+        key += (limit,)
+
+        with self.lock:
+            cached = self.trajectories.get(key)
+            if cached is not None:
+                self.hits += 1
+                self.trajectories.move_to_end(key)
+        if cached is None:
+            # решение вне блокировки: другие потоки тем временем берут готовые траектории
+            cached = trajectory(width, height, key[2:4], key[4:6], limit)
+            with self.lock:
+                self.misses += 1
+                self.trajectories[key] = cached
+                if len(self.trajectories) > self.maxsize:
+                    self.trajectories.popitem(last=False)
+                    self.evictions += 1
+
+        shot, points = cached
+        if shot.pocket is not None:
+            corner = _restore(symmetry, (shot.pocket % 2 * width, shot.pocket // 2 * height), width, height)
+            shot = shot._replace(pocket=(corner[0] == width) + (corner[1] == height) * 2)
+        return Trajectory(shot, tuple(_restore(symmetry, point, width, height) for point in points))
+
+    def clear(self):
+        """
+        Очищает кэш и статистику
+        :return: None
+        """
+        with self.lock:
+            self.trajectories.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Статистика кэша
+        :return: словарь с числом попаданий, промахов, вытеснений, долей попаданий и размером кэша
+        """
+        requests = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / requests if requests else 0.0, 'size': len(self.trajectories)}
@@ -0,0 +1,109 @@
+import math
+from typing import NamedTuple
+
+# Порядок луз совпадает с Game.board_corners
+LEFT_TOP, RIGHT_TOP, LEFT_BOTTOM, RIGHT_BOTTOM = range(4)
+
+
+class Shot(NamedTuple):
+    """
+    Результат удара в координатах решетки (единица длины - шаг сетки)
+    pocket - индекс лузы (в порядке board_corners) или None
+    bounces - число отскоков от бортов до попадания в лузу; если шар не попадает в лузу,
+              то число отскоков за один период замкнутой траектории
+    length - длина пути до лузы (или длина периода траектории)
+    """
+    pocket: object
+    bounces: int
+    length: float
+
+
+def direction(ball, aim):
+    """
+    Приведенное направление удара: вектор от шара к точке прицеливания, деленный на НОД координат
+    :param ball: позиция шара в клетках
+    :param aim: позиция точки прицеливания в клетках
+    :return: (dx, dy) с взаимно простыми координатами
+    """
+    dx = aim[0] - ball[0]
+    dy = aim[1] - ball[1]
+    if dx == dy == 0:
+        # как и make_vector, при совпадении точек бьем вертикально вниз
+        return 0, 1
+    g = math.gcd(dx, dy)
+    return dx // g, dy // g
+
+
+def _solve_congruence(a, b, m):
+    """
+    Решает сравнение a * t = b (mod m)
+    :return: (r, n) - все решения t = r (mod n), или None, если решений нет
+    """
+    g = math.gcd(a, m)
+    if b % g:
+        return None
+    n = m // g
+    return (b // g) * pow(a // g, -1, n) % n, n
+
+
+def _crossings(start, end, period):
+    """
+    Количество кратных period строго между целыми start и end
+    """
+    lo, hi = (start, end) if start < end else (end, start)
+    return (hi - 1) // period - lo // period
+
+
+def pocket_time(width, height, ball, dx, dy):
+    """
+    Момент попадания в лузу развернутого луча ball + t * (dx, dy).
+    Развернутый стол - решетка из отражений поля, лузы - узлы (m * width, n * height).
+    :return: наименьшее целое t > 0 или None, если луч не проходит через лузу
+    """
+    if dx == 0 or dy == 0:
+        return None
+    x = _solve_congruence(dx % width, -ball[0] % width, width)
+    y = _solve_congruence(dy % height, -ball[1] % height, height)
+    if x is None or y is None:
+        return None
+    (r1, n1), (r2, n2) = x, y
+    # китайская теорема об остатках для взаимно не простых модулей
+    g = math.gcd(n1, n2)
+    if (r2 - r1) % g:
+        return None
+    n = n1 // g * n2
+    t = (r1 + n1 * ((r2 - r1) // g * pow(n1 // g, -1, n2 // g) % (n2 // g))) % n
+    return t or n
+
+
+def period_time(width, height, dx, dy):
+    """
+    Период замкнутой траектории: наименьшее t > 0, после которого шар возвращается
+    в исходную точку с исходным направлением
+    """
+    tx = 2 * width // math.gcd(dx, 2 * width)
+    ty = 2 * height // math.gcd(dy, 2 * height)
+    return tx * ty // math.gcd(tx, ty)
+
+
+def solve(width, height, ball, aim):
+    """
+    Точное решение удара разверткой стола за O(1) целочисленных операций
+    :param width: ширина игрового поля в клетках
+    :param height: высота игрового поля в клетках
+    :param ball: позиция шара в клетках
+    :param aim: позиция точки прицеливания в клетках
+    :return: Shot
+    """
+    dx, dy = direction(ball, aim)
+    step = math.hypot(dx, dy)
+    t = pocket_time(width, height, ball, dx, dy)
+    if t is None:
+        t = period_time(width, height, dx, dy)
+        return Shot(None, abs(t * dx) // width + abs(t * dy) // height, t * step)
+    end_x = ball[0] + t * dx
+    end_y = ball[1] + t * dy
+    pocket = (end_x // width) % 2 + (end_y // height) % 2 * 2
+    bounces = _crossings(ball[0], end_x, width) + _crossings(ball[1], end_y, height)
+    return Shot(pocket, bounces, t * step)
+
@@ -0,0 +1,7 @@
+"""
+Начало отсчета для --startup-time. main.py импортирует этот модуль первым, до pygame,
+поэтому момент его импорта - начало запуска игры
+"""
+import time
+
+START_TIME = time.perf_counter()
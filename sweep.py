@@ -0,0 +1,195 @@
+"""
+Перебор полей, позиций шара и меток на пуле процессов для подбора правил начисления очков.
+
+Задание - поле и позиция шара. Процесс решает удары по всем меткам векторно (outcome_map) и пишет
+в свою строку общего массива (multiprocessing.shared_memory) число меток и гистограмму числа отскоков
+ударов, попадающих в лузу. Результаты не пересылаются между процессами, а правила (очки, max_bounces)
+применяются уже к гистограммам, так что один перебор годится для любых правил в пределах гистограммы.
+
+    python sweep.py --min-size 5 --max-size 30 --pocket-scores 5 --miss-scores -1
+"""
+import argparse
+import os
+import time
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
+
+import numpy as np
+
+from model import BilliardModel
+from outcome_map import outcome_map
+
+# число столбцов гистограммы отскоков: последний столбец - все удары с большим числом отскоков
+HISTOGRAM_SIZE = 17
+# на сколько частей на процесс делится перебор (баланс нагрузки между процессами)
+CHUNKS_PER_WORKER = 8
+
+_results = None
+
+
+class SweepRow(NamedTuple):
+    """
+    Статистика по размеру поля (средние - по позициям шара)
+    balls - число позиций шара, aims - число ударов
+    pocket_rate - доля ударов, попадающих в лузу
+    random_score - ожидаемые очки игрока, выбирающего метку наугад
+    optimal_score - ожидаемые очки игрока, всегда выбирающего выигрышную метку, если она есть
+    solvable - доля позиций шара, для которых есть выигрышная метка
+    """
+    width: int
+    height: int
+    balls: int
+    aims: int
+    pocket_rate: float
+    random_score: float
+    optimal_score: float
+    solvable: float
+
+
+def board_tasks(min_size, max_size):
+    """
+    Все задания перебора, сгруппированные по полям
+    :return: массив (N, 4): ширина, высота, x и y шара
+    """
+    tasks = [(width, height, x, y)
+             for width in range(min_size, max_size + 1)
+             for height in range(min_size, max_size + 1)
+             for x in range(1, width)
+             for y in range(1, height)]
+    return np.array(tasks, dtype=np.int32)
+
+
+def _attach(name, shape):
+    """
+    Инициализация процесса пула: подключение к общему массиву результатов
+    """
+    global _results
+    memory = SharedMemory(name=name)
+    _results = memory, np.ndarray(shape, dtype=np.int32, buffer=memory.buf)
+
+
+def _solve_tasks(tasks, results, start):
+    """
+    Решает задания и пишет строки результатов, начиная со строки start
+    """
+    for row, (width, height, x, y) in enumerate(tasks, start):
+        outcomes = outcome_map(int(width), int(height), (int(x), int(y)))
+        bounces = np.minimum(outcomes.bounces[outcomes.valid & outcomes.pocket], HISTOGRAM_SIZE - 1)
+        results[row, 0] = outcomes.valid.sum()
+        results[row, 1:] = np.bincount(bounces, minlength=HISTOGRAM_SIZE)
+
+
+def _sweep_chunk(chunk):
+    """
+    Задача процесса пула: часть заданий (строка начала, задания)
+    :return: число решенных заданий
+    """
+    start, tasks = chunk
+    _solve_tasks(tasks, _results[1], start)
+    return len(tasks)
+
+
+def run(tasks, workers=None):
+    """
+    Решает все задания
+    :param tasks: массив заданий board_tasks
+    :param workers: число процессов (None - по числу ядер, 1 - в текущем процессе)
+    :return: массив (N, 1 + HISTOGRAM_SIZE): число меток и гистограмма отскоков попаданий
+    """
+    workers = workers or os.cpu_count()
+    shape = (len(tasks), 1 + HISTOGRAM_SIZE)
+    if workers == 1:
+        results = np.zeros(shape, dtype=np.int32)
+        _solve_tasks(tasks, results, 0)
+        return results
+
+    memory = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.int32).itemsize)
+    try:
+        chunk_size = max(1, -(-len(tasks) // (workers * CHUNKS_PER_WORKER)))
+        chunks = [(start, tasks[start:start + chunk_size]) for start in range(0, len(tasks), chunk_size)]
+        with Pool(workers, initializer=_attach, initargs=(memory.name, shape)) as pool:
+            for _ in pool.imap_unordered(_sweep_chunk, chunks):
+                pass
+        return np.ndarray(shape, dtype=np.int32, buffer=memory.buf).copy()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def aggregate(tasks, results, max_bounces, pocket_scores, miss_scores):
+    """
+    Статистика по размерам полей при заданных правилах (поля без меток пропускаются)
+    :param tasks: массив заданий board_tasks
+    :param results: результаты run
+    :param max_bounces: максимальное число касаний бортов (включая попадание в лузу)
+    :param pocket_scores: очки за попадание
+    :param miss_scores: очки за промах
+    :return: список SweepRow
+    """
+    if not 0 < max_bounces < HISTOGRAM_SIZE:
+        raise ValueError(f'max_bounces must be in 1..{HISTOGRAM_SIZE - 1}')
+    # на поле 2x2 меток нет (единственное пересечение занято шаром) - такие задания не учитываются
+    keep = results[:, 0] > 0
+    tasks, results = tasks[keep], results[keep]
+    aims = results[:, 0].astype(np.float64)
+    pockets = results[:, 1:1 + max_bounces].sum(axis=1)
+    random_score = (pockets * pocket_scores + (aims - pockets) * miss_scores) / aims
+    optimal_score = np.where(pockets > 0, pocket_scores, miss_scores)
+
+    rows = []
+    boards, starts, counts = np.unique(tasks[:, :2], axis=0, return_index=True, return_counts=True)
+    for (width, height), start, count in zip(boards, starts, counts):
+        part = slice(start, start + count)
+        rows.append(SweepRow(int(width), int(height), int(count), int(aims[part].sum()),
+                             float(pockets[part].sum() / aims[part].sum()),
+                             float(random_score[part].mean()), float(optimal_score[part].mean()),
+                             float((pockets[part] > 0).mean())))
+    return rows
+
+
+def print_table(rows, field, title, fmt):
+    """
+    Печатает значение поля SweepRow в виде таблицы ширина x высота
+    """
+    widths = sorted({row.width for row in rows})
+    heights = sorted({row.height for row in rows})
+    values = {(row.width, row.height): getattr(row, field) for row in rows}
+    print(title)
+    print('  W\\H ' + ''.join(f'{height:>8d}' for height in heights))
+    for width in widths:
+        cells = ''.join(f'{values[(width, height)]:>8{fmt}}' if (width, height) in values else ' ' * 8
+                        for height in heights)
+        print(f'{width:5d} {cells}')
+    print()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Статистика очков по размерам полей на пуле процессов')
+    parser.add_argument('--min-size', type=int, default=5)
+    parser.add_argument('--max-size', type=int, default=10)
+    parser.add_argument('--max-bounces', type=int, default=BilliardModel.max_bounces)
+    parser.add_argument('--pocket-scores', type=int, default=BilliardModel.pocket_scores)
+    parser.add_argument('--miss-scores', type=int, default=BilliardModel.miss_scores)
+    parser.add_argument('--workers', type=int, help='число процессов (по умолчанию - по числу ядер)')
+    args = parser.parse_args()
+    # на поле 2x2 метка совпадает с шаром: таких полей нет в статистике
+    if not 3 <= args.min_size <= args.max_size:
+        parser.error('--min-size and --max-size must satisfy 3 <= MIN_SIZE <= MAX_SIZE')
+
+    tasks = board_tasks(args.min_size, args.max_size)
+    start = time.perf_counter()
+    results = run(tasks, args.workers)
+    elapsed = time.perf_counter() - start
+    rows = aggregate(tasks, results, args.max_bounces, args.pocket_scores, args.miss_scores)
+
+    print_table(rows, 'random_score', 'Expected score, random aim', '.2f')
+    print_table(rows, 'optimal_score', 'Expected score, optimal aim', '.2f')
+    print_table(rows, 'solvable', 'Share of ball positions with a pocketing aim', '.2f')
+    aims = sum(row.aims for row in rows)
+    balls = sum(row.balls for row in rows)
+    print(f'overall: pocket rate {sum(row.pocket_rate * row.aims for row in rows) / aims:.3f}, '
+          f'random {sum(row.random_score * row.balls for row in rows) / balls:.3f}, '
+          f'optimal {sum(row.optimal_score * row.balls for row in rows) / balls:.3f}')
+    print(f'{len(tasks)} boards/balls, {aims} shots in {elapsed:.2f} s '
+          f'({aims / elapsed:,.0f} shots/s, {args.workers or os.cpu_count()} workers)')
@@ -0,0 +1,97 @@
+"""
+Совпадение векторных intersect_many и make_vectors со скалярными geometry.intersect и geometry.make_vector
+
+    python -m pytest test_batch_geometry.py
+"""
+import random
+
+import numpy as np
+import pytest
+
+from batch_geometry import intersect_many, make_vectors, random_segments, self_check
+from geometry import Point, Vector, intersect, make_vector
+
+
+def scalar_intersections(first, second):
+    """
+    Результаты geometry.intersect для пар отрезков
+    :return: список (x, y) или None
+    """
+    results = []
+    for (start_1, end_1), (start_2, end_2) in zip(first.tolist(), second.tolist()):
+        point = intersect(Vector((Point(start_1), Point(end_1))), Vector((Point(start_2), Point(end_2))))
+        results.append(None if point is None else (point.x, point.y))
+    return results
+
+
+def assert_agree(first, second):
+    """
+    Сравнивает intersect_many с geometry.intersect для каждой пары
+    """
+    points, mask = intersect_many(first, second)
+    for i, expected in enumerate(scalar_intersections(first, second)):
+        assert mask[i] == (expected is not None), (first[i], second[i])
+        if expected is None:
+            assert np.isnan(points[i]).all()
+        else:
+            assert points[i] == pytest.approx(expected, abs=1e-9)
+
+
+@pytest.mark.parametrize('first, second', [
+    # пересекающиеся отрезки
+    (((0, 0), (4, 4)), ((0, 4), (4, 0))),
+    # непересекающиеся отрезки общего положения
+    (((0, 0), (1, 1)), ((3, 0), (4, -2))),
+    # параллельные отрезки на разных прямых
+    (((0, 0), (4, 2)), ((0, 1), (4, 3))),
+    (((1, 0), (1, 5)), ((2, 0), (2, 5))),
+    # отрезки на одной прямой: перекрытие, касание концами, разрыв
+    (((0, 0), (4, 2)), ((2, 1), (6, 3))),
+    (((0, 0), (4, 2)), ((4, 2), (8, 4))),
+    (((0, 0), (2, 1)), ((4, 2), (6, 3))),
+    (((6, 3), (2, 1)), ((4, 2), (0, 0))),
+    # вертикальные отрезки на одной прямой: перекрытие, касание, разрыв
+    (((1, 0), (1, 4)), ((1, 2), (1, 6))),
+    (((1, 4), (1, 0)), ((1, 4), (1, 6))),
+    (((1, 0), (1, 1)), ((1, 2), (1, 6))),
+    # один из отрезков вертикальный
+    (((2, 0), (2, 4)), ((0, 1), (4, 3))),
+    (((0, 1), (4, 3)), ((2, 0), (2, 4))),
+    (((5, 0), (5, 4)), ((0, 1), (4, 3))),
+    # горизонтальный и вертикальный, касание в конце
+    (((0, 2), (3, 2)), ((3, 0), (3, 5))),
+])
+def test_special_cases(first, second):
+    assert_agree(np.array([first], dtype=np.float64), np.array([second], dtype=np.float64))
+
+
+def test_random_segments():
+    rng = random.Random(1)
+    first = random_segments(rng, 5000, 100.0, False)
+    second = random_segments(rng, 5000, 100.0, False)
+    assert_agree(first, second)
+
+
+def test_random_grid_segments():
+    # на целочисленной сетке много вертикальных, параллельных и лежащих на одной прямой отрезков;
+    # скалярная функция может ошибиться на единицу младшего разряда на краю отрезка (см. self_check)
+    assert self_check(count=5000, seed=2) == 20000
+
+
+def test_make_vectors():
+    rng = random.Random(3)
+    starts = random_segments(rng, 2000, 100.0, False)[:, 0]
+    aims = random_segments(rng, 2000, 100.0, False)[:, 0]
+    # вертикальный отрезок вверх и вниз и совпадающие точки
+    starts[:3] = (5, 5)
+    aims[:3] = (5, 9), (5, 1), (5, 5)
+    lengths = np.array([rng.uniform(1, 1000) for _ in range(len(starts))])
+    ends = make_vectors(starts, aims, lengths)
+    for start, aim, length, end in zip(starts.tolist(), aims.tolist(), lengths.tolist(), ends):
+        expected = make_vector(Point(start), Point(aim), length).end
+        assert end == pytest.approx((expected.x, expected.y), rel=1e-12, abs=1e-9)
+
+
+def test_make_vectors_scalar_length():
+    ends = make_vectors([(0, 0), (1, 1)], [(3, 4), (1, 0)], 10)
+    assert np.allclose(ends, [(6, 8), (1, -9)])
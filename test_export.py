@@ -0,0 +1,52 @@
+"""
+Экспорт удара: в клип не попадает подсветка метки по указателю мыши, которого без окна нет
+
+    python -m pytest test_export.py
+"""
+import os
+
+# окно не нужно: кадры рисуются в память
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame  # noqa: E402
+
+from export import export  # noqa: E402
+from main import Game  # noqa: E402
+
+# поле больше окна: указатель в (0, 0) оказывается над меткой (1, 1)
+SIZE = 810
+BOARD = 18, 18
+BALL = 9, 9
+AIM = 7, 9
+HOVER = 1, 1
+FPS = 10
+LEAD = 0.5
+
+
+def region(surface, rect):
+    """
+    Пиксели области кадра
+    """
+    return pygame.image.tobytes(surface.subsurface(rect), 'RGB')
+
+
+def test_export_has_no_hover_after_hit(tmp_path):
+    result = export(str(tmp_path) + os.sep, *BOARD, BALL, AIM, fps=FPS, size=SIZE, lead=LEAD, hold=0.5)
+
+    # эталон: то же поле после удара без подсветки и с подсветкой метки HOVER
+    game = Game(SIZE, SIZE, 'Test')
+    game.set_track_pointer(False)
+    game.startup_game(*BOARD, BALL)
+    game.select_aim(AIM)
+    game.press_hit()
+    assert game.hover_position is None
+    rect = game.hover_rect(HOVER).clip(game.surface.get_rect())
+    game.draw_board()
+    clean = region(game.surface, rect)
+    game.hover_position = HOVER
+    game.draw_board()
+    assert region(game.surface, rect) != clean
+
+    for index in range(round(LEAD * FPS), result.frames):
+        frame = pygame.image.load(str(tmp_path / f'frame_{index:05d}.png'))
+        assert region(frame, rect) == clean, f'hover ring in frame {index}'
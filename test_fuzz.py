@@ -0,0 +1,67 @@
+"""
+Генерация ударов fuzz: самые маленькие поля, уменьшение ударов и независимость от числа процессов
+
+    python -m pytest test_fuzz.py
+"""
+import random
+
+import pytest
+
+import fuzz
+from fuzz import candidates, compare, random_case, valid
+
+
+@pytest.mark.parametrize('free_share', [0, 0.5, 1])
+@pytest.mark.parametrize('min_cells, max_cells', [(2, 2), (2, 3), (3, 3)])
+def test_random_case_smallest_boards(min_cells, max_cells, free_share):
+    rng = random.Random(0)
+    for _ in range(200):
+        case = random_case(rng, min_cells, max_cells, free_share)
+        assert min_cells <= case.width <= max_cells and min_cells <= case.height <= max_cells
+        assert valid(case)
+        assert compare(case) is None
+
+
+def test_random_case_2x2_is_free():
+    # на поле 2x2 метка не может отличаться от шара (1, 1)
+    case = random_case(random.Random(0), 2, 2, 0)
+    assert case.free and case.ball == (1, 1)
+
+
+def test_candidates_are_valid():
+    case = random_case(random.Random(1), 5, 10, 0)
+    for candidate in candidates(case):
+        assert valid(candidate)
+
+
+class InlinePool:
+    """
+    Пул процессов, выполняющий задачи в текущем процессе (чтобы видеть сгенерированные удары)
+    """
+    def __init__(self, workers):
+        self.workers = workers
+
+    def imap_unordered(self, function, tasks):
+        return map(function, tasks)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+def test_cases_do_not_depend_on_workers(monkeypatch):
+    generated = []
+
+    def recording_case(*args):
+        generated[-1].append(random_case(*args))
+        return generated[-1][-1]
+
+    monkeypatch.setattr(fuzz, 'Pool', InlinePool)
+    monkeypatch.setattr(fuzz, 'random_case', recording_case)
+    for workers in 1, 2, 7:
+        generated.append([])
+        fuzz.run(2500, seed=3, workers=workers)
+    assert len(generated[0]) == 2500
+    assert generated[0] == generated[1] == generated[2]
@@ -0,0 +1,47 @@
+"""
+Событийная модель physics: обработка всех событий разбивки за конечное число шагов
+
+    python -m pytest test_physics.py
+"""
+import math
+from collections import Counter
+
+import pytest
+
+from physics import Simulation, break_shot
+
+
+@pytest.mark.parametrize('speed', [8.0, 9.647656647367942])
+def test_break_shot_stops(speed):
+    # при скорости 9.647656647367942 шар 1 проходит по касательной мимо неподвижного шара 4:
+    # пара давала бесконечную серию столкновений в один момент
+    simulation = break_shot(speed=speed)
+    events = simulation.run()
+    assert events
+    assert not any(simulation.balls[i].moving() for i in range(len(simulation.balls)))
+    assert simulation.moment_events <= Simulation.max_events_per_moment
+
+
+def test_few_events_in_one_moment():
+    # шар 4 после удара медленнее min_speed и останавливается в тот же момент, шар 1 снова его догоняет;
+    # скорость сближения каждый раз уменьшается в десятки раз, и серия кончается на APPROACH_EPSILON
+    simulation = break_shot(speed=9.647656647367942)
+    moments = Counter(event.time for event in simulation.run())
+    assert max(moments.values()) < 20
+
+
+def test_tangential_motion_is_not_contact():
+    # касание по касательной: ошибка округления дает отрицательное произведение порядка 1e-17
+    assert Simulation.contact(0.6062078463256331, 0.3500172096529499, -0.0673567291624664, 0.11665762881089126,
+                              0.7) is None
+    assert Simulation.contact(-2.0, 0.0, 1.0, 0.0, 0.7) == pytest.approx(1.3)
+
+
+def test_grazing_balls_do_not_exchange_velocity():
+    simulation = Simulation(10.0, 5.0, radius=0.35, pocket_radius=0.4)
+    first = simulation.add_ball(5.0, 2.5)
+    second = simulation.add_ball(5.0, 2.5 + 0.7, 1.0, 0.0)
+    simulation.collide(first, second)
+    assert simulation.state(first)[2:] == (0.0, 0.0)
+    assert simulation.state(second)[2:] == (1.0, 0.0)
+    assert math.isfinite(simulation.time)
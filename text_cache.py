@@ -0,0 +1,111 @@
+import json
+import os
+from collections import OrderedDict
+
+import pygame
+
+
+def font_paths_file():
+    """
+    Файл, в котором между запусками хранятся найденные пути к системным шрифтам
+    :return: путь к файлу
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'py_game_ya_billiards', 'fonts.json')
+
+
+class TextCache:
+    """
+    Реестр шрифтов по ключу (имя, размер) и LRU-кэш отрисованных надписей по ключу (текст, шрифт, цвет).
+    Пути к системным шрифтам хранятся на диске (paths_file): pygame.font.SysFont при каждом запуске
+    сканирует все шрифты системы, а здесь поиск делается только для еще не встречавшегося имени
+    """
+    def __init__(self, maxsize=128, paths_file=None):
+        self.maxsize = maxsize
+        self.paths_file = paths_file
+        self.paths = None
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font_path(self, name):
+        """
+        Путь к файлу системного шрифта (как у pygame.font.SysFont) из кэша на диске или поиском по системе
+        :param name: имя системного шрифта (None - шрифт по умолчанию)
+        :return: путь к файлу или None (шрифт по умолчанию)
+        """
+        if name is None:
+            return None
+        if self.paths is None:
+            self.paths = {}
+            try:
+                with open(self.paths_file or font_paths_file()) as file:
+                    self.paths = json.load(file)
+            except (OSError, ValueError):
+                pass
+        path = self.paths.get(name)
+        if name not in self.paths or (path is not None and not os.path.exists(path)):
+            path = self.paths[name] = pygame.font.match_font(name)
+            try:
+                paths_file = self.paths_file or font_paths_file()
+                os.makedirs(os.path.dirname(paths_file), exist_ok=True)
+                with open(paths_file, 'w') as file:
+                    json.dump(self.paths, file)
+            except OSError:
+                # кэш путей - только ускорение, без него шрифт найдется и при следующем запуске
+                pass
+        return path
+
+    def font(self, name, size):
+        """
+        Возвращает шрифт, создавая его при первом обращении
+        :param name: имя системного шрифта (None - шрифт по умолчанию)
+        :param size: размер шрифта
+        :return: pygame.font.Font
+        """
+        key = (name, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = self.fonts[key] = pygame.font.Font(self.font_path(name), size)
+        return font
+
+    def render(self, text, name, size, color):
+        """
+        Возвращает поверхность с надписью, отрисовывая ее только при промахе кэша
+        :param text: текст надписи
+        :param name: имя системного шрифта (None - шрифт по умолчанию)
+        :param size: размер шрифта
+        :param color: цвет надписи
+        :return: pygame.Surface
+        """
+        key = (text, name, size, tuple(color))
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.surfaces[key] = self.font(name, size).render(text, 1, color)
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        """
+        Очищает кэш надписей и счетчики (шрифты остаются)
+        :return: None
+        """
+        self.surfaces.clear()
+        self.hits = self.misses = 0
+
+    def stats(self):
+        """
+        Статистика кэша надписей
+        :return: словарь с числом попаданий, промахов и закэшированных надписей
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.surfaces)}
+
+
+# общий кэш для всех элементов интерфейса
+text_cache = TextCache()
@@ -0,0 +1,186 @@
+"""
+Пакетная отрисовка превью полей без окна.
+
+Поле рисуется тем же кодом, что и в игре (Game.build_static_layer без заголовков и шар), сразу в масштабе
+превью через вид на поле Game: поле, которое в превью целиком не помещается, уменьшается дальше.
+Превью рисуется в поверхность из пула и кодируется в PNG на потоках пула кодирования, пока рисуется
+следующее поле; закодированная поверхность возвращается в пул. В работе не больше workers * 2 превью,
+поэтому память не растет с числом полей, а ошибка кодирования останавливает отрисовку сразу.
+
+    python thumbnails.py --count 1000 --scale 0.25 --output thumbnails/
+"""
+import argparse
+import os
+import queue
+import resource
+import threading
+import time
+from typing import NamedTuple
+
+# окно не нужно: поля рисуются в память
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np  # noqa: E402
+import pygame  # noqa: E402
+
+from export import WriteQueue, encode_png  # noqa: E402
+from main import Game  # noqa: E402
+
+
+class ThumbnailResult(NamedTuple):
+    """
+    Итог отрисовки: число превью, время в секундах и пиковый объем памяти процесса в мегабайтах
+    """
+    images: int
+    elapsed: float
+    peak_memory: float
+
+
+class SurfacePool:
+    """
+    Пул поверхностей одного размера: acquire ждет, пока освободится поверхность
+    :param size: размер поверхностей
+    :param count: число поверхностей
+    """
+    def __init__(self, size, count):
+        self.free = queue.Queue()
+        for _ in range(count):
+            self.free.put(pygame.Surface(size).convert())
+
+    def acquire(self):
+        """
+        Берет поверхность из пула (ждет, если свободных нет)
+        :return: pygame.Surface
+        """
+        return self.free.get()
+
+    def release(self, surface):
+        """
+        Возвращает поверхность в пул
+        :param surface: поверхность из пула
+        :return: None
+        """
+        self.free.put(surface)
+
+
+def peak_memory():
+    """
+    Пиковый объем памяти процесса (max RSS) в мегабайтах
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ThumbnailRenderer:
+    """
+    Отрисовка превью полей
+    :param scale: масштаб превью относительно окна игры
+    :param workers: число потоков кодирования PNG
+    :param size: размер окна игры, в котором рисуется поле
+    :param compression: уровень сжатия zlib
+    """
+    def __init__(self, scale=0.25, workers=2, size=800, compression=6):
+        self.game = Game(size, size, 'Thumbnails')
+        self.scale = scale
+        # превью - поле без слоя интерфейса внизу окна
+        self.size = max(1, round(size * scale)), max(1, round((size - self.game.hud_height) * scale))
+        self.compression = compression
+        # на каждый поток кодирования - одно превью в работе и одно в очереди, и еще одна поверхность
+        # для отрисовки следующего превью
+        self.queue = WriteQueue(workers, workers * 2)
+        self.pool = SurfacePool(self.size, workers * 2 + 1)
+        self.buffers = threading.local()
+
+    def fit_view(self):
+        """
+        Вид на поле для превью: масштаб scale, но не крупнее, чем нужно, чтобы поле поместилось в превью
+        целиком; поле - в центре превью. Место под лузы и борт оставляется в пикселях превью,
+        иначе у очень больших полей они уходили бы за край
+        :return: None
+        """
+        game = self.game
+        margin = (game.border_line_thickness + game.pocket_radius) * self.scale
+        zoom = min(self.scale,
+                   (self.size[0] - margin * 2) / game.board_width,
+                   (self.size[1] - margin * 2) / game.board_height)
+        # вид задается напрямую: ограничения set_view рассчитаны на окно игры, а не на превью
+        game.zoom = zoom
+        game.view_x = game.board_x + game.board_width / 2 - self.size[0] / zoom / 2
+        game.view_y = game.board_y + game.board_height / 2 - self.size[1] / zoom / 2
+
+    def render(self, parameters, surface):
+        """
+        Рисует превью поля
+        :param parameters: (ширина поля в клетках, высота поля в клетках, позиция шара) -
+            как возвращает get_random_game_parameters
+        :param surface: поверхность размера превью
+        :return: None
+        """
+        self.game.startup_game(*parameters)
+        self.fit_view()
+        self.game.build_static_layer(surface, titles=False)
+        self.game.draw_ball(surface)
+
+    def encode(self, surface, path):
+        """
+        Задача потока кодирования: сохраняет превью и возвращает поверхность в пул
+        """
+        try:
+            rows = getattr(self.buffers, 'rows', None)
+            if rows is None:
+                # буфер строк PNG - свой у каждого потока
+                rows = self.buffers.rows = np.zeros((self.size[1], 1 + self.size[0] * 3), dtype=np.uint8)
+            data = encode_png(surface, rows, self.compression)
+        finally:
+            self.pool.release(surface)
+        with open(path, 'wb') as file:
+            file.write(data)
+
+    def run(self, boards, directory):
+        """
+        Рисует и сохраняет превью всех полей в каталог
+        :param boards: список параметров полей (см. render)
+        :param directory: каталог для превью (создается при необходимости)
+        :return: ThumbnailResult
+        """
+        os.makedirs(directory, exist_ok=True)
+        start = time.perf_counter()
+        for index, parameters in enumerate(boards):
+            width_in_cells, height_in_cells, _ = parameters
+            surface = self.pool.acquire()
+            self.render(parameters, surface)
+            path = os.path.join(directory, f'board_{index:05d}_{width_in_cells}x{height_in_cells}.png')
+            # ждет самое старое превью, если в работе уже workers * 2 (его ошибка выбрасывается здесь)
+            self.queue.submit(self.encode, surface, path)
+        self.queue.wait()
+        return ThumbnailResult(len(boards), time.perf_counter() - start, peak_memory())
+
+    def close(self):
+        """
+        Дожидается кодирования и останавливает потоки
+        :return: None
+        """
+        self.queue.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Пакетная отрисовка превью случайных полей')
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float, default=0.25, help='масштаб превью относительно окна игры')
+    parser.add_argument('--workers', type=int, default=2, help='число потоков кодирования PNG')
+    parser.add_argument('--min-cells', type=int, default=Game.min_cells)
+    parser.add_argument('--max-cells', type=int, default=Game.max_cells)
+    parser.add_argument('--output', default='thumbnails')
+    args = parser.parse_args()
+
+    Game.min_cells = args.min_cells
+    Game.max_cells = args.max_cells
+    renderer = ThumbnailRenderer(args.scale, args.workers)
+    # поля - как в игре с зерном seed
+    renderer.game.rng.seed(args.seed)
+    boards = [renderer.game.get_random_game_parameters() for _ in range(args.count)]
+    result = renderer.run(boards, args.output)
+    renderer.close()
+    print(f'{result.images} thumbnails {renderer.size[0]}x{renderer.size[1]} written to {args.output} '
+          f'in {result.elapsed:.2f} s ({result.images / result.elapsed:.0f} images/s), '
+          f'peak memory {result.peak_memory:.0f} MB')